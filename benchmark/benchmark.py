@@ -37,6 +37,13 @@ from bitstream import *
 def do_nothing():
     pass
 
+def import_bitstream():
+    """
+    >>> import subprocess, sys
+    >>> command = [sys.executable, "-X", "importtime", "-c", "import bitstream"]
+    >>> _ = subprocess.check_output(command, stderr=subprocess.STDOUT)
+    """
+
 def write_bools_1_by_1_loop_only():
     """
     >>> bools = 44100 * 2 * 8 * [True, False]
@@ -1152,6 +1159,446 @@ def read_int32_all():
     >>> stream.read(int32, n)
     """
 
+# Aligned vs. non-aligned integer arrays: the word-at-a-time kernels
+# should make both cases run at roughly the same speed.
+# ------------------------------------------------------------------------------
+
+def write_uint16_array_aligned():
+    """
+    >>> n = 44100 * 2
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint16)
+    >>> stream.write(array_, uint16)
+    """
+
+def write_uint16_array_not_aligned():
+    """
+    >>> n = 44100 * 2
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint16)
+    >>> stream.write(array_, uint16)
+    """
+
+def read_uint16_array_aligned():
+    """
+    >>> n = 44100 * 2
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint16)
+    >>> stream.write(array_, uint16)
+    >>> _ = stream.read(uint16, n)
+    """
+
+def read_uint16_array_not_aligned():
+    """
+    >>> n = 44100 * 2
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint16)
+    >>> stream.write(array_, uint16)
+    >>> stream.read(bool, 4)
+    [True, True, True, True]
+    >>> _ = stream.read(uint16, n)
+    """
+
+def write_uint32_array_aligned():
+    """
+    >>> n = 44100
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint32)
+    >>> stream.write(array_, uint32)
+    """
+
+def write_uint32_array_not_aligned():
+    """
+    >>> n = 44100
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint32)
+    >>> stream.write(array_, uint32)
+    """
+
+def read_uint32_array_aligned():
+    """
+    >>> n = 44100
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint32)
+    >>> stream.write(array_, uint32)
+    >>> _ = stream.read(uint32, n)
+    """
+
+def read_uint32_array_not_aligned():
+    """
+    >>> n = 44100
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint32)
+    >>> stream.write(array_, uint32)
+    >>> stream.read(bool, 4)
+    [True, True, True, True]
+    >>> _ = stream.read(uint32, n)
+    """
+
+def write_uint64_array_aligned():
+    """
+    >>> n = 44100 // 2
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint64)
+    >>> stream.write(array_, uint64)
+    """
+
+def write_uint64_array_not_aligned():
+    """
+    >>> n = 44100 // 2
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint64)
+    >>> stream.write(array_, uint64)
+    """
+
+def read_uint64_array_aligned():
+    """
+    >>> n = 44100 // 2
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint64)
+    >>> stream.write(array_, uint64)
+    >>> _ = stream.read(uint64, n)
+    """
+
+def read_uint64_array_not_aligned():
+    """
+    >>> n = 44100 // 2
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint64)
+    >>> stream.write(array_, uint64)
+    >>> stream.read(bool, 4)
+    [True, True, True, True]
+    >>> _ = stream.read(uint64, n)
+    """
+
+def write_bytes_1MB():
+    """
+    >>> data = 2**20 * b"A"
+    >>> stream = BitStream(data)
+    """
+
+def from_buffer_1MB():
+    """
+    >>> data = 2**20 * b"A"
+    >>> stream = BitStream.from_buffer(data)
+    """
+
+def read_bytes_1MB():
+    """
+    >>> data = 2**20 * b"A"
+    >>> stream = BitStream(data)
+    >>> _ = stream.read(bytes)
+    """
+
+def write_uint16_array_1_thread():
+    """
+    >>> n = 44100 * 64
+    >>> array = ones(n, dtype=uint16)
+    >>> _ = BitStream(array, uint16)
+    """
+
+def write_uint16_array_4_threads():
+    """
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> n = 44100 * 64
+    >>> arrays = [ones(n, dtype=uint16) for _ in range(4)]
+    >>> with ThreadPoolExecutor(4) as executor:
+    ...     _ = list(executor.map(lambda array: BitStream(array, uint16), arrays))
+    """
+
+def read_uint12_array_1_thread():
+    """
+    >>> n = 44100 * 64
+    >>> stream = BitStream(ones(n, dtype=uint16), uint(12))
+    >>> _ = stream.read(uint(12), n)
+    """
+
+def read_uint12_array_4_threads():
+    """
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> n = 44100 * 64
+    >>> streams = [BitStream(ones(n, dtype=uint16), uint(12)) for _ in range(4)]
+    >>> with ThreadPoolExecutor(4) as executor:
+    ...     _ = list(executor.map(lambda stream: stream.read(uint(12), n), streams))
+    """
+
+def write_uint12_chunks_serial():
+    """
+    >>> chunks = [ones(44100 * 16, dtype=uint16) for _ in range(4)]
+    >>> stream = BitStream()
+    >>> for chunk in chunks:
+    ...     stream.write(chunk, uint(12))
+    """
+
+def write_uint12_chunks_parallel_encode():
+    """
+    >>> chunks = [ones(44100 * 16, dtype=uint16) for _ in range(4)]
+    >>> stream = parallel_encode(chunks, uint(12), workers=4)
+    """
+
+def write_bitstream_1000_headers_and_payloads():
+    """
+    >>> header = BitStream([True, False, True])
+    >>> payload = BitStream(1000 * [True])
+    >>> stream = BitStream()
+    >>> for _ in range(1000):
+    ...     stream.write(header.copy())
+    ...     stream.write(payload.copy())
+    """
+
+def extend_1000_headers_and_payloads():
+    """
+    >>> header = BitStream([True, False, True])
+    >>> payload = BitStream(1000 * [True])
+    >>> stream = BitStream()
+    >>> for _ in range(1000):
+    ...     stream += header
+    ...     stream += payload
+    """
+
+def join_1000_headers_and_payloads():
+    """
+    >>> header = BitStream([True, False, True])
+    >>> payload = BitStream(1000 * [True])
+    >>> stream = BitStream.join(1000 * [header, payload])
+    """
+
+def read_bitstream_10000_frames_of_10kB():
+    """
+    >>> stream = BitStream(10000 * 10240 * b"A")
+    >>> for _ in range(10000):
+    ...     _ = stream.read(BitStream, 8 * 10240)
+    """
+
+def read_bitstream_and_write_200_frames_of_8kB_in_16MB():
+    """
+    >>> stream = BitStream(16 * 1024 * 1024 * b"A")
+    >>> frame = 8192 * b"A"
+    >>> for _ in range(200):
+    ...     _ = stream.read(BitStream, 8 * 8192)
+    ...     stream.write(frame)
+    """
+
+def peek_uint32_with_save_restore_1000():
+    """
+    >>> stream = BitStream(1000 * [1], uint32)
+    >>> for _ in range(1000):
+    ...     state = stream.save()
+    ...     _ = stream.read(uint32)
+    ...     stream.restore(state)
+    """
+
+def peek_uint32_1000():
+    """
+    >>> stream = BitStream(1000 * [1], uint32)
+    >>> for _ in range(1000):
+    ...     _ = stream.peek(uint32)
+    """
+
+def read_at_uint32_1000():
+    """
+    >>> stream = BitStream(1000 * [1], uint32)
+    >>> for i in range(1000):
+    ...     _ = stream.read_at(32 * i, uint32)
+    """
+
+def save_restore_nested_100():
+    """
+    >>> stream = BitStream(1000 * [True])
+    >>> def parse(depth):
+    ...     state = stream.save()
+    ...     _ = stream.read(bool)
+    ...     if depth:
+    ...         parse(depth - 1)
+    ...     stream.restore(state)
+    >>> for _ in range(100):
+    ...     parse(100)
+    """
+
+def transaction_nested_100():
+    """
+    >>> stream = BitStream(1000 * [True])
+    >>> def parse(depth):
+    ...     with stream.transaction():
+    ...         _ = stream.read(bool)
+    ...         if depth:
+    ...             parse(depth - 1)
+    >>> for _ in range(100):
+    ...     parse(100)
+    """
+
+def equal_1MB_not_aligned():
+    """
+    >>> stream = BitStream(2**20 * b"A")
+    >>> other = BitStream(True)
+    >>> other.write(2**20 * b"A")
+    >>> _ = other.read(bool)
+    >>> _ = stream == other
+    """
+
+def hash_1000_streams_of_1kB():
+    """
+    >>> streams = [BitStream(1024 * bytes([i % 256])) for i in range(1000)]
+    >>> cache = {}
+    >>> for stream in streams:
+    ...     cache[stream] = True
+    """
+
+def str_1Mbit():
+    """
+    >>> stream = BitStream(2**17 * b"A")
+    >>> _ = str(stream)
+    """
+
+def from_bits_1Mbit():
+    """
+    >>> bits = 2**17 * "01000001"
+    >>> stream = BitStream.from_bits(bits)
+    """
+
+def hex_1MB():
+    """
+    >>> stream = BitStream(2**20 * b"A")
+    >>> _ = stream.hex()
+    """
+
+def write_prefix_code_1M_symbols():
+    """
+    >>> code = PrefixCode.from_frequencies({i: 2**(16-i) for i in range(16)})
+    >>> symbols = random.geometric(0.5, 2**20) - 1
+    >>> symbols = minimum(symbols, 15)
+    >>> stream = BitStream(symbols, code)
+    """
+
+def read_prefix_code_1M_symbols():
+    """
+    >>> code = PrefixCode.from_frequencies({i: 2**(16-i) for i in range(16)})
+    >>> symbols = random.geometric(0.5, 2**20) - 1
+    >>> stream = BitStream(minimum(symbols, 15), code)
+    >>> _ = stream.read(code, 2**20)
+    """
+
+def write_exp_golomb_1M_integers():
+    """
+    >>> integers = random.geometric(0.05, 2**20) - 1
+    >>> stream = BitStream(integers, exp_golomb())
+    """
+
+def read_exp_golomb_1M_integers():
+    """
+    >>> integers = random.geometric(0.05, 2**20) - 1
+    >>> stream = BitStream(integers, exp_golomb())
+    >>> _ = stream.read(exp_golomb(), 2**20)
+    """
+
+def read_rice_1M_integers():
+    """
+    >>> integers = random.geometric(0.05, 2**20) - 1
+    >>> stream = BitStream(integers, rice(4, signed=True))
+    >>> _ = stream.read(rice(4, signed=True), 2**20)
+    """
+
+def write_varint_1M_integers():
+    """
+    >>> integers = random.geometric(0.001, 2**20)
+    >>> stream = BitStream(integers, varint)
+    """
+
+def read_varint_1M_integers():
+    """
+    >>> integers = random.geometric(0.001, 2**20)
+    >>> stream = BitStream(integers, varint)
+    >>> _ = stream.read(varint, 2**20)
+    """
+
+def read_svarint_1M_integers_not_aligned():
+    """
+    >>> integers = random.geometric(0.001, 2**20)
+    >>> stream = BitStream(True)
+    >>> stream.write(integers, svarint)
+    >>> _ = stream.read(bool)
+    >>> _ = stream.read(svarint, 2**20)
+    """
+
+def count_varints_1M_integers():
+    """
+    >>> integers = random.geometric(0.001, 2**20)
+    >>> stream = BitStream(integers, varint)
+    >>> _ = count_varints(stream)
+    """
+
+def write_packed_1M_timestamps():
+    """
+    >>> timestamps = cumsum(random.randint(0, 1000, 2**20))
+    >>> stream = BitStream()
+    >>> write_packed(stream, timestamps)
+    """
+
+def read_packed_1M_timestamps():
+    """
+    >>> timestamps = cumsum(random.randint(0, 1000, 2**20))
+    >>> stream = BitStream()
+    >>> write_packed(stream, timestamps)
+    >>> _ = read_packed(stream)
+    """
+
+def write_runs_8M_bools():
+    """
+    >>> bools = cumsum(random.random(2**23) < 0.001) % 2 == 1
+    >>> stream = BitStream()
+    >>> write_runs(stream, bools)
+    """
+
+def read_runs_8M_bools():
+    """
+    >>> bools = cumsum(random.random(2**23) < 0.001) % 2 == 1
+    >>> stream = BitStream()
+    >>> write_runs(stream, bools)
+    >>> _ = read_runs(stream, 2**23)
+    """
+
+def count_run_8M_bits():
+    """
+    >>> stream = BitStream(bytes(2**20))
+    >>> _ = count_run(stream, False)
+    """
+
+def write_uint32le_array_not_aligned():
+    """
+    >>> n = 44100
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint32)
+    >>> stream.write(array_, uint32le)
+    """
+
+def read_uint32le_array_not_aligned():
+    """
+    >>> n = 44100
+    >>> stream = BitStream(4 * [True])
+    >>> array_ = ones(n, dtype=uint32)
+    >>> stream.write(array_, uint32le)
+    >>> stream.read(bool, 4)
+    [True, True, True, True]
+    >>> _ = stream.read(uint32le, n)
+    """
+
+def write_uint12_array():
+    """
+    >>> n = 44100 * 2
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint16)
+    >>> stream.write(array_, uint(12))
+    """
+
+def read_uint12_array():
+    """
+    >>> n = 44100 * 2
+    >>> stream = BitStream()
+    >>> array_ = ones(n, dtype=uint16)
+    >>> stream.write(array_, uint(12))
+    >>> _ = stream.read(uint(12), n)
+    """
+
 # ------------------------------------------------------------------------------
 
 def read_float64_1_by_1():
@@ -1209,6 +1656,32 @@ def read_float64_all():
     """
 
 
+def read_float32_all():
+    """
+    >>> n = (44100 * 16 * 2) // 32
+    >>> floats = ones(n, dtype=float32)
+    >>> stream = BitStream(floats)
+    >>> _floats = stream.read(float32, n)
+    """
+
+def read_float32_all_not_aligned():
+    """
+    >>> n = (44100 * 16 * 2) // 32
+    >>> floats = ones(n, dtype=float32)
+    >>> stream = BitStream(4 * [True])
+    >>> stream.write(floats)
+    >>> _ = stream.read(bool, 4)
+    >>> _floats = stream.read(float32, n)
+    """
+
+def write_float32_all():
+    """
+    >>> n = (44100 * 16 * 2) // 32
+    >>> floats = ones(n, dtype=float32)
+    >>> stream = BitStream()
+    >>> stream.write(floats)
+    """
+
 def write_float64_1_by_1_auto_type_not_aligned():
     """
     >>> n = (44100 * 16 * 2) / 64
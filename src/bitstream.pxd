@@ -1,31 +1,91 @@
 cimport numpy as np
 
+cdef struct _Snapshot:
+    unsigned long long read_offset
+    unsigned long long write_offset
+    unsigned long long id
+    Py_ssize_t refs # number of states that refer to the snapshot
+
+cdef class _Memory:
+    cdef unsigned char *_bytes
+    cdef size_t _num_bytes
+
 cdef class BitStream:
     cdef unsigned char *_bytes
     cdef size_t _num_bytes
+    cdef size_t _capacity
     cdef unsigned long long _read_offset
     cdef unsigned long long _write_offset
-    cdef public list _states
-    cdef unsigned int _state_id
+    cdef _Snapshot *_snapshots
+    cdef size_t _num_snapshots
+    cdef size_t _snapshots_capacity
+    cdef unsigned long long _snapshot_id
+    cdef public size_t compact_threshold
+    cdef Py_buffer _buffer
+    cdef bint _borrowed
+    cdef bint _sharing
+    cdef unsigned long long _view_end
+    cdef Py_ssize_t _exports
+    cdef long long _base_offset
+    cdef bint _hashed
+    cdef Py_hash_t _hash
+    cdef unsigned long long _hash_read_offset
+    cdef unsigned long long _hash_write_offset
 
     cdef dict readers    
     cdef dict writers
 
     cpdef int _extend(BitStream self, size_t num_bits) except -1
+    cdef int _resize(BitStream self, size_t capacity) except -1
+    cdef unsigned long long _live_offset(BitStream self) noexcept
+    cdef void _rebase(BitStream self, size_t num_bytes) noexcept
+    cdef int _compact(BitStream self) except -1
+    cdef int _own(BitStream self, size_t num_bits=?) except -1
+    cdef int _share(BitStream self) except -1
+    cdef str _bits(BitStream self, size_t num_bits)
     cpdef write(BitStream self, data, object type=?)
     cpdef read(BitStream self, object type=?, n=?)
+    cpdef peek(BitStream self, object type=?, n=?)
+    cpdef read_at(BitStream self, position, object type=?, n=?)
+    cpdef tell(BitStream self)
+    cpdef seek(BitStream self, position)
     cpdef copy(BitStream self, n=?)
+    cpdef extend(BitStream self, BitStream other)
     cpdef State save(BitStream self)
     cpdef restore(BitStream self, State state)
+    cdef void _release(BitStream self, State state) noexcept
+
+cdef class MappedBitStream(BitStream):
+    cdef object _file
+    cdef object _mmap
+    cdef Py_buffer _map_buffer
+    cdef bint _mapped
+    cdef bint _writable
+    cdef bint _closed
+    cdef readonly str mode
+    cdef public size_t chunk_size
+
+    cdef int _map(MappedBitStream self, size_t size) except -1
+    cdef int _unmap(MappedBitStream self) except -1
+    cdef int _check_open(MappedBitStream self) except -1
+    cdef int _check_writable(MappedBitStream self) except -1
+    cpdef write(MappedBitStream self, data, object type=?)
+    cpdef read(MappedBitStream self, object type=?, n=?)
 
 cdef class State:
     cdef readonly BitStream _stream
-    cdef readonly unsigned long long _read_offset
-    cdef readonly unsigned long long _write_offset
-    cdef readonly unsigned int _id
+    cdef readonly size_t _index
+    cdef readonly unsigned long long _id
+
+cdef class _Transaction:
+    cdef BitStream _stream
+    cdef State _state
 
 cpdef read_bool(BitStream stream, n=?)
 cpdef write_bool(BitStream stream, bools)
+cpdef read_bool_array(BitStream stream, n=?)
+cpdef read_bitmap(BitStream stream, n)
+cpdef write_bitmap(BitStream stream, bitmap, n=?)
 cpdef write_uint8(BitStream stream, data)
 cpdef _write_uint8(BitStream stream, np.ndarray[np.uint8_t, ndim=1] uint8s)
 cpdef read_uint8(BitStream stream, n=?)
@@ -50,11 +110,92 @@ cpdef _write_uint64(BitStream stream, np.ndarray[np.uint64_t, ndim=1] uint64s)
 cpdef read_int64(BitStream stream, n=?)
 cpdef write_int64(BitStream stream, data)
 cpdef _write_int64(BitStream stream, np.ndarray[np.int64_t, ndim=1] int64s)
+cdef class uint:
+    cdef readonly unsigned int num_bits
+    cdef readonly bint lsb_first
+
+cdef class sint:
+    cdef readonly unsigned int num_bits
+    cdef readonly bint lsb_first
+
+cpdef read_uint(BitStream stream, unsigned int num_bits, n=?, bint lsb_first=?)
+cpdef write_uint(BitStream stream, unsigned int num_bits, data, bint lsb_first=?)
+cpdef read_sint(BitStream stream, unsigned int num_bits, n=?, bint lsb_first=?)
+cpdef write_sint(BitStream stream, unsigned int num_bits, data, bint lsb_first=?)
+
+cdef class little_endian:
+    cdef readonly type type
+    cdef readonly unsigned int width
+
+cpdef read_little_endian(BitStream stream, little_endian type, n=?)
+cpdef write_little_endian(BitStream stream, little_endian type, data)
 cpdef read_float64(BitStream stream, n=?)
 cpdef write_float64(BitStream stream, data)
 cpdef _write_float64(BitStream stream, np.ndarray[np.float64_t, ndim=1] float64s)
+cpdef read_float32(BitStream stream, n=?)
+cpdef write_float32(BitStream stream, data)
+cpdef _write_float32(BitStream stream, np.ndarray[np.float32_t, ndim=1] float32s)
+cpdef read_float16(BitStream stream, n=?)
+cpdef write_float16(BitStream stream, data)
 cpdef read_bytes(BitStream stream, n=?)
 cpdef write_bytes(BitStream stream, string)
 cpdef write_bitstream(BitStream sink, BitStream source)
 cpdef read_bitstream(BitStream source, n=?)
 
+cdef class PrefixCode:
+    cdef readonly dict table
+    cdef tuple _symbols
+    cdef dict _indices
+    cdef np.ndarray _codes
+    cdef np.ndarray _lengths
+    cdef np.ndarray _symbol_array
+    cdef np.ndarray _index_table
+    cdef long long _index_min
+    cdef np.ndarray _tree
+    cdef np.ndarray _table_counts
+    cdef np.ndarray _table_symbols
+    cdef np.ndarray _table_ends
+
+cpdef read_prefix_code(BitStream stream, PrefixCode code, n=?)
+cpdef write_prefix_code(BitStream stream, PrefixCode code, data)
+
+cdef class _integer_code:
+    cdef readonly bint signed
+    cdef unsigned int _code
+    cdef unsigned int _k
+    cdef unsigned int _mapping
+
+cdef class exp_golomb(_integer_code):
+    pass
+
+cdef class rice(_integer_code):
+    pass
+
+cdef class elias_gamma(_integer_code):
+    pass
+
+cdef class elias_delta(_integer_code):
+    pass
+
+cpdef read_integer_code(BitStream stream, _integer_code type, n=?)
+cpdef write_integer_code(BitStream stream, _integer_code type, data)
+
+cdef class varint:
+    pass
+
+cdef class svarint:
+    pass
+
+cpdef read_varint(BitStream stream, n=?)
+cpdef write_varint(BitStream stream, data)
+cpdef read_svarint(BitStream stream, n=?)
+cpdef write_svarint(BitStream stream, data)
+cpdef count_varints(BitStream stream, num_bytes=?)
+
+cpdef write_packed(BitStream stream, data, block=?, delta=?)
+cpdef read_packed(BitStream stream, n=?)
+
+cpdef count_run(BitStream stream, bint value)
+cpdef write_runs(BitStream stream, data)
+cpdef read_runs(BitStream stream, n)
+
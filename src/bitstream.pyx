@@ -15,37 +15,75 @@ try:
 except:
     import __builtin__ as builtins
 cdef object builtins_type = builtins.type
-import atexit
-import copy
-import doctest
-import hashlib
+import io
+import mmap
 import os.path
-import shutil
-import struct
-import sys
-import tempfile
-import timeit
+import warnings
 
 # Third Party Libraries
 import numpy
-import setuptools
-import pkg_resources
 
 # Cython
 cimport cython
 cimport numpy as np
+np.import_array()
 from libc.stdlib cimport malloc, realloc, free
-from libc.string cimport memcpy
+from libc.stdint cimport uint16_t, uint32_t, uint64_t
+from libc.string cimport memcpy, memmove, memcmp, memset
 from cpython cimport bool as boolean, Py_INCREF, Py_DECREF, PyObject, PyObject_GetIter, PyErr_Clear
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, PyBuffer_FillInfo, PyBUF_SIMPLE, PyBUF_WRITABLE
+from cpython.bytes cimport PyBytes_FromStringAndSize, PyBytes_AS_STRING
 
-# Context: https://github.com/python/cpython/issues/91062
-cdef extern from "Python.h": 
+# Portable byte swaps, leading zeros counts (of non-zero words), 
+# population counts and big-endian 64-bit words loads and stores.
+cdef extern from *:
     """
-    #if (PY_VERSION_HEX < ((3 << 24) | (11 << 16)))
-    #define PyFloat_Pack8 _PyFloat_Pack8 
+    #include <stdint.h>
+    #include <string.h>
+    #if defined(_MSC_VER)
+    #include <stdlib.h>
+    #define bitstream_bswap16(x) _byteswap_ushort(x)
+    #define bitstream_bswap32(x) _byteswap_ulong(x)
+    #define bitstream_bswap64(x) _byteswap_uint64(x)
+    #include <intrin.h>
+    static __inline int bitstream_clz64(uint64_t x) {
+        unsigned long index;
+        _BitScanReverse64(&index, x);
+        return 63 - (int)index;
+    }
+    #define bitstream_popcount64(x) ((int)__popcnt64(x))
+    #else
+    #define bitstream_bswap16(x) __builtin_bswap16(x)
+    #define bitstream_bswap32(x) __builtin_bswap32(x)
+    #define bitstream_bswap64(x) __builtin_bswap64(x)
+    #define bitstream_clz64(x) __builtin_clzll(x)
+    #define bitstream_popcount64(x) __builtin_popcountll(x)
     #endif
+
+    static CYTHON_INLINE uint64_t bitstream_load_be64(const unsigned char *p) {
+        uint64_t word;
+        memcpy(&word, p, 8);
+    #if PY_LITTLE_ENDIAN
+        word = bitstream_bswap64(word);
+    #endif
+        return word;
+    }
+
+    static CYTHON_INLINE void bitstream_store_be64(unsigned char *p, uint64_t word) {
+    #if PY_LITTLE_ENDIAN
+        word = bitstream_bswap64(word);
+    #endif
+        memcpy(p, &word, 8);
+    }
     """
-    int PyFloat_Pack8(double x, unsigned char *p, int le) except -1
+    int PY_LITTLE_ENDIAN
+    uint16_t bswap16 "bitstream_bswap16" (uint16_t x) noexcept nogil
+    uint32_t bswap32 "bitstream_bswap32" (uint32_t x) noexcept nogil
+    uint64_t bswap64 "bitstream_bswap64" (uint64_t x) noexcept nogil
+    int clz64 "bitstream_clz64" (uint64_t x) noexcept nogil
+    int popcount64 "bitstream_popcount64" (uint64_t x) noexcept nogil
+    uint64_t load_be64 "bitstream_load_be64" (const unsigned char *p) noexcept nogil
+    void store_be64 "bitstream_store_be64" (unsigned char *p, uint64_t word) noexcept nogil
 
 
 
@@ -69,9 +107,15 @@ cdef type int32   = numpy.int32
 cdef type uint64  = numpy.uint64
 cdef type int64  = numpy.int64
 cdef type float64 = numpy.float64
+cdef type float32 = numpy.float32
+cdef type float16 = numpy.float16
 cdef type ndarray = numpy.ndarray
 cdef object zero = 0
 cdef object one  = 1
+cdef size_t min_capacity = 16 # bytes
+cdef size_t nogil_threshold = 4096 # bytes, release the GIL for larger copies
+cdef size_t view_threshold = 4096 # bytes, larger sub-streams share memory
+cdef size_t repr_max_bits = 4096 # longer streams are truncated by repr
 
 
 # Cython Interface (pxd file)
@@ -81,32 +125,92 @@ _include = None
 _pxd_src = b"""\
 cimport numpy as np
 
+cdef struct _Snapshot:
+    unsigned long long read_offset
+    unsigned long long write_offset
+    unsigned long long id
+    Py_ssize_t refs # number of states that refer to the snapshot
+
+cdef class _Memory:
+    cdef unsigned char *_bytes
+    cdef size_t _num_bytes
+
 cdef class BitStream:
     cdef unsigned char *_bytes
     cdef size_t _num_bytes
+    cdef size_t _capacity
     cdef unsigned long long _read_offset
     cdef unsigned long long _write_offset
-    cdef public list _states
-    cdef unsigned int _state_id
+    cdef _Snapshot *_snapshots
+    cdef size_t _num_snapshots
+    cdef size_t _snapshots_capacity
+    cdef unsigned long long _snapshot_id
+    cdef public size_t compact_threshold
+    cdef Py_buffer _buffer
+    cdef bint _borrowed
+    cdef bint _sharing
+    cdef unsigned long long _view_end
+    cdef Py_ssize_t _exports
+    cdef long long _base_offset
+    cdef bint _hashed
+    cdef Py_hash_t _hash
+    cdef unsigned long long _hash_read_offset
+    cdef unsigned long long _hash_write_offset
 
     cdef dict readers    
     cdef dict writers
 
     cpdef int _extend(BitStream self, size_t num_bits) except -1
+    cdef int _resize(BitStream self, size_t capacity) except -1
+    cdef unsigned long long _live_offset(BitStream self) noexcept
+    cdef void _rebase(BitStream self, size_t num_bytes) noexcept
+    cdef int _compact(BitStream self) except -1
+    cdef int _own(BitStream self, size_t num_bits=?) except -1
+    cdef int _share(BitStream self) except -1
+    cdef str _bits(BitStream self, size_t num_bits)
     cpdef write(BitStream self, data, object type=?)
     cpdef read(BitStream self, object type=?, n=?)
+    cpdef peek(BitStream self, object type=?, n=?)
+    cpdef read_at(BitStream self, position, object type=?, n=?)
+    cpdef tell(BitStream self)
+    cpdef seek(BitStream self, position)
     cpdef copy(BitStream self, n=?)
+    cpdef extend(BitStream self, BitStream other)
     cpdef State save(BitStream self)
     cpdef restore(BitStream self, State state)
+    cdef void _release(BitStream self, State state) noexcept
+
+cdef class MappedBitStream(BitStream):
+    cdef object _file
+    cdef object _mmap
+    cdef Py_buffer _map_buffer
+    cdef bint _mapped
+    cdef bint _writable
+    cdef bint _closed
+    cdef readonly str mode
+    cdef public size_t chunk_size
+
+    cdef int _map(MappedBitStream self, size_t size) except -1
+    cdef int _unmap(MappedBitStream self) except -1
+    cdef int _check_open(MappedBitStream self) except -1
+    cdef int _check_writable(MappedBitStream self) except -1
+    cpdef write(MappedBitStream self, data, object type=?)
+    cpdef read(MappedBitStream self, object type=?, n=?)
 
 cdef class State:
     cdef readonly BitStream _stream
-    cdef readonly unsigned long long _read_offset
-    cdef readonly unsigned long long _write_offset
-    cdef readonly unsigned int _id
+    cdef readonly size_t _index
+    cdef readonly unsigned long long _id
+
+cdef class _Transaction:
+    cdef BitStream _stream
+    cdef State _state
 
 cpdef read_bool(BitStream stream, n=?)
 cpdef write_bool(BitStream stream, bools)
+cpdef read_bool_array(BitStream stream, n=?)
+cpdef read_bitmap(BitStream stream, n)
+cpdef write_bitmap(BitStream stream, bitmap, n=?)
 cpdef write_uint8(BitStream stream, data)
 cpdef _write_uint8(BitStream stream, np.ndarray[np.uint8_t, ndim=1] uint8s)
 cpdef read_uint8(BitStream stream, n=?)
@@ -131,18 +235,100 @@ cpdef _write_uint64(BitStream stream, np.ndarray[np.uint64_t, ndim=1] uint64s)
 cpdef read_int64(BitStream stream, n=?)
 cpdef write_int64(BitStream stream, data)
 cpdef _write_int64(BitStream stream, np.ndarray[np.int64_t, ndim=1] int64s)
+cdef class uint:
+    cdef readonly unsigned int num_bits
+    cdef readonly bint lsb_first
+
+cdef class sint:
+    cdef readonly unsigned int num_bits
+    cdef readonly bint lsb_first
+
+cpdef read_uint(BitStream stream, unsigned int num_bits, n=?, bint lsb_first=?)
+cpdef write_uint(BitStream stream, unsigned int num_bits, data, bint lsb_first=?)
+cpdef read_sint(BitStream stream, unsigned int num_bits, n=?, bint lsb_first=?)
+cpdef write_sint(BitStream stream, unsigned int num_bits, data, bint lsb_first=?)
+
+cdef class little_endian:
+    cdef readonly type type
+    cdef readonly unsigned int width
+
+cpdef read_little_endian(BitStream stream, little_endian type, n=?)
+cpdef write_little_endian(BitStream stream, little_endian type, data)
 cpdef read_float64(BitStream stream, n=?)
 cpdef write_float64(BitStream stream, data)
 cpdef _write_float64(BitStream stream, np.ndarray[np.float64_t, ndim=1] float64s)
+cpdef read_float32(BitStream stream, n=?)
+cpdef write_float32(BitStream stream, data)
+cpdef _write_float32(BitStream stream, np.ndarray[np.float32_t, ndim=1] float32s)
+cpdef read_float16(BitStream stream, n=?)
+cpdef write_float16(BitStream stream, data)
 cpdef read_bytes(BitStream stream, n=?)
 cpdef write_bytes(BitStream stream, string)
 cpdef write_bitstream(BitStream sink, BitStream source)
 cpdef read_bitstream(BitStream source, n=?)
+
+cdef class PrefixCode:
+    cdef readonly dict table
+    cdef tuple _symbols
+    cdef dict _indices
+    cdef np.ndarray _codes
+    cdef np.ndarray _lengths
+    cdef np.ndarray _symbol_array
+    cdef np.ndarray _index_table
+    cdef long long _index_min
+    cdef np.ndarray _tree
+    cdef np.ndarray _table_counts
+    cdef np.ndarray _table_symbols
+    cdef np.ndarray _table_ends
+
+cpdef read_prefix_code(BitStream stream, PrefixCode code, n=?)
+cpdef write_prefix_code(BitStream stream, PrefixCode code, data)
+
+cdef class _integer_code:
+    cdef readonly bint signed
+    cdef unsigned int _code
+    cdef unsigned int _k
+    cdef unsigned int _mapping
+
+cdef class exp_golomb(_integer_code):
+    pass
+
+cdef class rice(_integer_code):
+    pass
+
+cdef class elias_gamma(_integer_code):
+    pass
+
+cdef class elias_delta(_integer_code):
+    pass
+
+cpdef read_integer_code(BitStream stream, _integer_code type, n=?)
+cpdef write_integer_code(BitStream stream, _integer_code type, data)
+
+cdef class varint:
+    pass
+
+cdef class svarint:
+    pass
+
+cpdef read_varint(BitStream stream, n=?)
+cpdef write_varint(BitStream stream, data)
+cpdef read_svarint(BitStream stream, n=?)
+cpdef write_svarint(BitStream stream, data)
+cpdef count_varints(BitStream stream, num_bytes=?)
+
+cpdef write_packed(BitStream stream, data, block=?, delta=?)
+cpdef read_packed(BitStream stream, n=?)
+
+cpdef count_run(BitStream stream, bint value)
+cpdef write_runs(BitStream stream, data)
+cpdef read_runs(BitStream stream, n)
 """
 
 def get_include():
     "Return a path to a directory that contains the bitstream pxd file"
     global _include
+    import tempfile
     if _include is None:
         _include = tempfile.mkdtemp(prefix='bitstream-')
         pxd_path = os.path.join(_include, 'bitstream.pxd')
@@ -152,12 +338,14 @@ def get_include():
     return _include
 
 def _cleanup():
+    import shutil
     if _include is not None:
         shutil.rmtree(_include)
 
 # Do NOT remove automatically the _include directory; 
 # we may leak a few files but we will avoid some bugs.
 #
+# import atexit
 # atexit.register(_cleanup)
 
 
@@ -170,8 +358,331 @@ cdef inline unsigned char rem8(unsigned long long value):
     return value & 7
 
 
+# Bit Kernels
+# ------------------------------------------------------------------------------
+# Bits are stored most significant bit first; bit offsets are measured 
+# from the start of the byte buffers. The kernels below load and store 
+# 64-bit words when they can, so that unaligned data is processed with one 
+# shift per word instead of a pair of masks and shifts per byte.
+# They never access bytes outside of the bit ranges they are given.
+
+@cython.profile(False)
+cdef inline uint64_t _get_bits(const unsigned char *src, 
+                               unsigned long long offset,
+                               unsigned int num_bits) noexcept nogil:
+    """
+    Return the `num_bits` bits (1 to 64) of `src` found at `offset`.
+    """
+    cdef const unsigned char *pointer = src + (offset >> 3)
+    cdef unsigned int bit_index = offset & 7
+    cdef unsigned int num_bytes = (bit_index + num_bits + 7) >> 3
+    cdef unsigned int i
+    cdef uint64_t word
+
+    if num_bytes >= 8:
+        word = load_be64(pointer) << bit_index
+        if num_bytes == 9:
+            word = word | (pointer[8] >> (8 - bit_index))
+    else:
+        word = 0
+        for i in range(num_bytes):
+            word = (word << 8) | pointer[i]
+        word = word << (64 - 8 * num_bytes + bit_index)
+    return word >> (64 - num_bits)
+
+@cython.profile(False)
+cdef inline void _put_bits(unsigned char *dst, 
+                           unsigned long long offset,
+                           unsigned int num_bits, 
+                           uint64_t value) noexcept nogil:
+    """
+    Write the `num_bits` lowest bits (1 to 64) of `value` into `dst` at `offset`.
+
+    The other bits of `dst` are left unchanged.
+    """
+    cdef unsigned char *pointer = dst + (offset >> 3)
+    cdef unsigned int bit_index = offset & 7
+    cdef unsigned int end = bit_index + num_bits
+    cdef unsigned int num_bytes, shift, i
+    cdef uint64_t word, mask
+
+    if end > 64: # the last byte is handled separately.
+        shift = end - 64
+        _put_bits(dst, offset, num_bits - shift, value >> shift)
+        pointer[8] = (pointer[8] & (0xFF >> shift)) | \
+                     <unsigned char>(value << (8 - shift))
+        return
+    mask = (<uint64_t>-1) >> (64 - num_bits)
+    word = (value & mask) << (64 - end)
+    mask = mask << (64 - end)
+    num_bytes = (end + 7) >> 3
+    for i in range(num_bytes):
+        shift = 56 - 8 * i
+        pointer[i] = (pointer[i] & ~<unsigned char>(mask >> shift)) | \
+                     <unsigned char>(word >> shift)
+
+@cython.profile(False)
+cdef void _copy_bits(unsigned char *dst, unsigned long long dst_offset,
+                     const unsigned char *src, unsigned long long src_offset,
+                     unsigned long long num_bits) noexcept nogil:
+    """
+    Copy `num_bits` bits from `src` at `src_offset` to `dst` at `dst_offset`.
+
+    The bits of `dst` outside of the destination range are left unchanged.
+    The source and destination ranges should not overlap.
+    """
+    cdef unsigned int dst_bit, src_bit, num_head, shift_c
+    cdef size_t num_bytes, i
+    cdef unsigned char mask
+    cdef uint64_t word
+
+    if num_bits == 0:
+        return
+    dst = dst + (dst_offset >> 3)
+    src = src + (src_offset >> 3)
+    dst_bit = dst_offset & 7
+    src_bit = src_offset & 7
+
+    # byte-align the destination
+    if dst_bit != 0:
+        num_head = 8 - dst_bit
+        if num_head > num_bits:
+            num_head = num_bits
+        _put_bits(dst, dst_bit, num_head, _get_bits(src, src_bit, num_head))
+        dst = dst + 1
+        src_bit = src_bit + num_head
+        src = src + (src_bit >> 3)
+        src_bit = src_bit & 7
+        num_bits = num_bits - num_head
+
+    num_bytes = num_bits >> 3
+    if src_bit == 0:
+        memcpy(dst, src, num_bytes)
+    else:
+        shift_c = 8 - src_bit
+        i = 0
+        while i + 8 <= num_bytes:
+            word = (load_be64(src + i) << src_bit) | (src[i + 8] >> shift_c)
+            store_be64(dst + i, word)
+            i += 8
+        while i < num_bytes:
+            dst[i] = <unsigned char>((src[i] << src_bit) | (src[i + 1] >> shift_c))
+            i += 1
+
+    num_bits = num_bits & 7
+    if num_bits:
+        _put_bits(dst + num_bytes, 0, num_bits, 
+                  _get_bits(src + num_bytes, src_bit, num_bits))
+
+@cython.profile(False)
+cdef bint _equal_bits(const unsigned char *a, unsigned long long a_offset,
+                      const unsigned char *b, unsigned long long b_offset,
+                      unsigned long long num_bits) noexcept nogil:
+    """
+    Compare `num_bits` bits of `a` at `a_offset` and of `b` at `b_offset`.
+    """
+    cdef unsigned int num_head
+    cdef size_t num_bytes
+
+    if (a_offset & 7) == (b_offset & 7): # byte-align both, then memcmp
+        num_head = (8 - (a_offset & 7)) & 7
+        if num_head > num_bits:
+            num_head = num_bits
+        if num_head:
+            if _get_bits(a, a_offset, num_head) != \
+               _get_bits(b, b_offset, num_head):
+                return False
+            a_offset += num_head
+            b_offset += num_head
+            num_bits -= num_head
+        num_bytes = num_bits >> 3
+        if memcmp(a + (a_offset >> 3), b + (b_offset >> 3), num_bytes):
+            return False
+        a_offset += 8 * <unsigned long long>num_bytes
+        b_offset += 8 * <unsigned long long>num_bytes
+        num_bits = num_bits & 7
+    else:
+        while num_bits >= 64:
+            if _get_bits(a, a_offset, 64) != _get_bits(b, b_offset, 64):
+                return False
+            a_offset += 64
+            b_offset += 64
+            num_bits -= 64
+    if num_bits:
+        return _get_bits(a, a_offset, num_bits) == _get_bits(b, b_offset, num_bits)
+    return True
+
+@cython.profile(False)
+cdef uint64_t _hash_bits(const unsigned char *src, unsigned long long offset,
+                         unsigned long long num_bits) noexcept nogil:
+    """
+    Non-cryptographic hash of `num_bits` bits of `src` at `offset`.
+
+    The result depends on the bits values, not on their offset.
+    """
+    cdef uint64_t h = 0x9E3779B97F4A7C15ULL ^ num_bits
+    while num_bits >= 64:
+        h = (h ^ _get_bits(src, offset, 64)) * 0xFF51AFD7ED558CCDULL
+        h = h ^ (h >> 32)
+        offset += 64
+        num_bits -= 64
+    if num_bits:
+        h = (h ^ _get_bits(src, offset, num_bits)) * 0xFF51AFD7ED558CCDULL
+    # splitmix64 finalizer
+    h = (h ^ (h >> 30)) * 0xBF58476D1CE4E5B9ULL
+    h = (h ^ (h >> 27)) * 0x94D049BB133111EBULL
+    return h ^ (h >> 31)
+
+cdef unsigned char _bits_table[256][8] # bits of every byte, one per byte.
+
+cdef int _init_bits_table() except -1:
+    cdef unsigned int i, j
+    for i in range(256):
+        for j in range(8):
+            _bits_table[i][j] = (i >> (7 - j)) & 1
+    return 0
+
+_init_bits_table()
+
+@cython.profile(False)
+cdef void _unpack_bits(unsigned char *dst, 
+                       const unsigned char *src, unsigned long long offset,
+                       size_t n) noexcept nogil:
+    """
+    Expand the `n` bits of `src` found at `offset` into `n` bytes (0 or 1).
+    """
+    cdef unsigned char buffer[4096]
+    cdef size_t chunk, i
+
+    while n > 0:
+        chunk = min(n, 8 * 4096)
+        _copy_bits(buffer, 0, src, offset, chunk)
+        for i in range(chunk >> 3):
+            memcpy(dst + 8 * i, _bits_table[buffer[i]], 8)
+        for i in range(chunk & ~(<size_t>7), chunk):
+            dst[i] = (buffer[i >> 3] >> (7 - (i & 7))) & 1
+        dst = dst + chunk
+        offset = offset + chunk
+        n = n - chunk
+
+@cython.profile(False)
+cdef void _pack_bits(unsigned char *dst, unsigned long long offset,
+                     const unsigned char *src, size_t n) noexcept nogil:
+    """
+    Pack `n` bytes of `src` (zero or nonzero) as `n` bits into `dst` at `offset`.
+    """
+    cdef unsigned char buffer[4096]
+    cdef unsigned char byte
+    cdef size_t chunk, i, j
+
+    while n > 0:
+        chunk = min(n, 8 * 4096)
+        for i in range(chunk >> 3):
+            byte = 0
+            for j in range(8):
+                byte = (byte << 1) | (src[8 * i + j] != 0)
+            buffer[i] = byte
+        if chunk & 7:
+            byte = 0
+            for j in range(chunk & ~(<size_t>7), chunk):
+                byte = (byte << 1) | (src[j] != 0)
+            buffer[chunk >> 3] = byte << (8 - (chunk & 7))
+        _copy_bits(dst, offset, buffer, 0, chunk)
+        src = src + chunk
+        offset = offset + chunk
+        n = n - chunk
+
+@cython.profile(False)
+cdef void _swap_bytes(unsigned char *dst, const unsigned char *src, 
+                      size_t n, unsigned int width) noexcept nogil:
+    """
+    Reverse the byte order of `n` items of `width` bytes (1, 2, 4 or 8).
+
+    The arrays `src` and `dst` may be identical.
+    """
+    cdef size_t i
+    cdef uint16_t item16
+    cdef uint32_t item32
+    cdef uint64_t item64
+
+    if width == 1:
+        if dst != src:
+            memcpy(dst, src, n)
+    elif width == 2:
+        for i in range(n):
+            memcpy(&item16, src + 2 * i, 2)
+            item16 = bswap16(item16)
+            memcpy(dst + 2 * i, &item16, 2)
+    elif width == 4:
+        for i in range(n):
+            memcpy(&item32, src + 4 * i, 4)
+            item32 = bswap32(item32)
+            memcpy(dst + 4 * i, &item32, 4)
+    else:
+        for i in range(n):
+            memcpy(&item64, src + 8 * i, 8)
+            item64 = bswap64(item64)
+            memcpy(dst + 8 * i, &item64, 8)
+
+@cython.profile(False)
+cdef void _read_words(unsigned char *dst, 
+                      const unsigned char *src, unsigned long long offset,
+                      size_t n, unsigned int width, 
+                      bint little=False) noexcept nogil:
+    """
+    Decode `n` big-endian (or little-endian) items of `width` bytes found 
+    at `offset` in `src` into the native array `dst`.
+    """
+    _copy_bits(dst, 0, src, offset, 8 * width * <unsigned long long>n)
+    if PY_LITTLE_ENDIAN != little:
+        _swap_bytes(dst, dst, n, width)
+
+@cython.profile(False)
+cdef void _write_words(unsigned char *dst, unsigned long long offset,
+                       const unsigned char *src, 
+                       size_t n, unsigned int width,
+                       bint little=False) noexcept nogil:
+    """
+    Encode the native array `src` of `n` items of `width` bytes as big-endian
+    (or little-endian) data into `dst` at `offset`.
+    """
+    cdef unsigned char buffer[4096]
+    cdef size_t chunk, max_chunk = 4096 // width
+
+    if width == 1 or PY_LITTLE_ENDIAN == little:
+        _copy_bits(dst, offset, src, 0, 8 * width * <unsigned long long>n)
+    elif (offset & 7) == 0:
+        _swap_bytes(dst + (offset >> 3), src, n, width)
+    else:
+        while n > 0:
+            chunk = min(n, max_chunk)
+            _swap_bytes(buffer, src, chunk, width)
+            _copy_bits(dst, offset, buffer, 0, 8 * width * chunk)
+            src = src + width * chunk
+            offset = offset + 8 * width * chunk
+            n = n - chunk
+
+
+
+# Shared Memory
+# ------------------------------------------------------------------------------
+cdef class _Memory:
+    """
+    Memory block of a stream, shared with its views.
+
+    Streams borrow the block through the buffer protocol;
+    it is freed when the last of them releases it.
+    """
+    def __getbuffer__(_Memory self, Py_buffer *buffer, int flags):
+        PyBuffer_FillInfo(buffer, self, self._bytes, self._num_bytes, 1, flags)
+
+    def __dealloc__(self):
+        free(self._bytes)
+
+
 # BitStream
 # ------------------------------------------------------------------------------
+@cython.no_gc_clear # the buffer of `from_buffer` is released in __dealloc__
 cdef class BitStream:
     """
     BitStream class / constructor
@@ -192,19 +703,25 @@ cdef class BitStream:
         >>> stream = BitStream("Hello", bytes)
         >>> stream = BitStream(42, uint8)
     """    
-    def __cinit__(self):
+    def __cinit__(self, *args, **kwargs):
         self._read_offset = 0
         self._write_offset = 0
         self._num_bytes = 0
+        self._capacity = 0
         self._bytes = NULL
 
-        cdef State state = State.__new__(State)
-        state._stream = self
-        state._read_offset = self._read_offset
-        state._write_offset = self._write_offset
-        state._id = self._state_id
-        self._states = [state]
-        self._state_id = 0
+        self._snapshots = NULL
+        self._num_snapshots = 0
+        self._snapshots_capacity = 0
+        self._snapshot_id = 0
+
+        self.compact_threshold = 0
+        self._borrowed = False
+        self._sharing = False
+        self._view_end = 0
+        self._exports = 0
+        self._base_offset = 0
+        self._hashed = False
 
     def __init__(self, *args, **kwargs):
         if args or kwargs:
@@ -214,21 +731,329 @@ cdef class BitStream:
         """
         Make room for `num_bits` extra bits into the stream.
 
+        The capacity grows geometrically, so that a long sequence of small 
+        writes triggers only a logarithmic number of reallocations.
+
+        When the stream runs out of capacity and its consumed prefix is
+        larger than `compact_threshold` bytes, the stream is compacted first.
+
+        A stream that shares its memory with views keeps on writing in place 
+        as long as the new bits are beyond the end of every view; otherwise,
+        it switches to a private copy of the data it may still read.
+
         Warning: a reallocation may take place and invalidate `self._bytes`.
-        The attributes `_read_offset` and `_write_offset` are unchanged.
-        """
-        cdef long num_extra_bits
-        cdef size_t num_extra_bytes, new_num_bytes        
-        
-        num_extra_bits = num_bits + self._write_offset - 8 * self._num_bytes
-        if num_extra_bits > 0:
-            num_extra_bytes = num_extra_bits // 8
-            num_extra_bits  = num_extra_bits - 8 * num_extra_bytes
-            new_num_bytes = self._num_bytes + num_extra_bytes + (num_extra_bits != 0)
-            self._bytes = <unsigned char *>realloc(self._bytes, new_num_bytes)
-            self._num_bytes = new_num_bytes
+        A compaction may also shift `_read_offset` and `_write_offset`:
+        compute byte and bit indices only *after* the call to `_extend`.
+        """
+        cdef size_t num_bytes, new_capacity, num_read_bytes
+
+        self._hashed = False
+        num_bytes = (self._write_offset + num_bits + 7) // 8
+        if self._borrowed:
+            if not self._sharing or self._write_offset < self._view_end or \
+               num_bytes > self._capacity:
+                self._own(num_bits)
+                num_bytes = (self._write_offset + num_bits + 7) // 8
+        if num_bytes > self._capacity and self.compact_threshold and \
+           self._exports == 0:
+            num_read_bytes = self._read_offset // 8
+            if num_read_bytes >= self.compact_threshold and \
+               num_read_bytes >= self._num_bytes - num_read_bytes:
+                self._compact()
+                num_bytes = (self._write_offset + num_bits + 7) // 8
+        if num_bytes > self._capacity:
+            new_capacity = max(num_bytes, 2 * self._capacity, min_capacity)
+            self._resize(new_capacity)
+        if num_bytes > self._num_bytes:
+            self._num_bytes = num_bytes
+        return 0
+
+    cdef int _resize(BitStream self, size_t capacity) except -1:
+        """
+        Reallocate the stream buffer to hold exactly `capacity` bytes.
+
+        Warning: the buffer contents beyond `capacity` are lost.
+        """
+        cdef unsigned char *_bytes
+        if self._exports:
+            raise BufferError("the stream memory is exported.")
+        if self._borrowed:
+            self._own()
+        if capacity == 0:
+            free(self._bytes)
+            self._bytes = NULL
+        else:
+            if capacity < nogil_threshold:
+                _bytes = <unsigned char *>realloc(self._bytes, capacity)
+            else: # the reallocation may copy the buffer
+                with nogil:
+                    _bytes = <unsigned char *>realloc(self._bytes, capacity)
+            if _bytes == NULL:
+                raise MemoryError()
+            self._bytes = _bytes
+        self._capacity = capacity
+        return 0
+
+    cdef int _compact(BitStream self) except -1:
+        """
+        Drop the bytes of the stream that are fully consumed.
+
+        The bytes that a saved state may still restore are preserved.
+        The stream offsets and the offsets of the snapshots are shifted 
+        accordingly.
+        """
+        cdef size_t num_bytes = self._live_offset() // 8
+        if num_bytes == 0:
+            return 0
+        if self._exports:
+            raise BufferError("the stream memory is exported.")
+
+        if self._borrowed: # borrowed memory: skip the consumed bytes
+            self._bytes += num_bytes
+            self._capacity -= num_bytes
+        else:
+            memmove(self._bytes, self._bytes + num_bytes, 
+                    self._num_bytes - num_bytes)
+        self._rebase(num_bytes)
+        return 0
+
+    cdef unsigned long long _live_offset(BitStream self) noexcept:
+        """
+        Return the offset of the first bit that the stream may still read.
+
+        The snapshots that no state refers to cannot be restored anymore:
+        they do not pin any data.
+        """
+        cdef size_t i
+        cdef _Snapshot *snapshot
+        cdef unsigned long long offset = self._read_offset
+        for i in range(self._num_snapshots):
+            snapshot = &self._snapshots[i]
+            if snapshot.refs and snapshot.read_offset < offset:
+                offset = snapshot.read_offset
+        return offset
+
+    cdef void _rebase(BitStream self, size_t num_bytes) noexcept:
+        """
+        Shift the offsets of the stream and of its snapshots 
+        when its first `num_bytes` bytes are dropped.
+        """
+        cdef size_t i
+        cdef _Snapshot *snapshot
+        self._num_bytes -= num_bytes
+        self._read_offset -= 8 * num_bytes
+        self._write_offset -= 8 * num_bytes
+        self._base_offset += 8 * num_bytes
+        self._view_end -= min(self._view_end, 8 * num_bytes)
+        self._hashed = False
+        for i in range(self._num_snapshots):
+            snapshot = &self._snapshots[i]
+            if snapshot.refs:
+                snapshot.read_offset -= 8 * num_bytes
+                snapshot.write_offset -= 8 * num_bytes
+
+    cdef int _own(BitStream self, size_t num_bits=0) except -1:
+        """
+        Replace the borrowed memory by a private copy, 
+        with room for `num_bits` extra bits.
+
+        Only the data that the stream may still read is copied.
+        """
+        cdef unsigned char *_bytes
+        cdef size_t start = self._live_offset() // 8
+        cdef size_t num_bytes = self._num_bytes - start
+        cdef size_t capacity = max(num_bytes, min_capacity)
+        if num_bits:
+            capacity = max(capacity, 2 * num_bytes, 
+                           (self._write_offset + num_bits + 7) // 8 - start)
+        if self._exports:
+            raise BufferError("the stream memory is exported.")
+        _bytes = <unsigned char *>malloc(capacity)
+        if _bytes == NULL:
+            raise MemoryError()
+        if num_bytes < nogil_threshold:
+            memcpy(_bytes, self._bytes + start, num_bytes)
+        else:
+            with nogil:
+                memcpy(_bytes, self._bytes + start, num_bytes)
+        PyBuffer_Release(&self._buffer)
+        self._borrowed = False
+        self._sharing = False
+        self._bytes = _bytes
+        self._capacity = capacity
+        self._rebase(start)
+        return 0
+
+    cdef int _share(BitStream self) except -1:
+        """
+        Transfer the memory of the stream to a `_Memory` block
+        that views may borrow too.
+        """
+        cdef _Memory memory
+        if self._borrowed:
+            return 0
+        memory = _Memory.__new__(_Memory)
+        memory._bytes = self._bytes
+        memory._num_bytes = self._capacity
+        PyObject_GetBuffer(memory, &self._buffer, PyBUF_SIMPLE)
+        self._borrowed = True
+        self._sharing = True
         return 0
 
+    @classmethod
+    def from_buffer(cls, obj, offset_bits=0, length_bits=None):
+        """
+        Create a stream that reads the memory of `obj` without a copy.
+
+        The object `obj` should support the buffer protocol 
+        (`bytes`, `memoryview`, `mmap`, contiguous NumPy arrays, etc.).
+        Its memory is never modified: the first write into the stream 
+        replaces it by a private copy.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream.from_buffer(b"ABC", 4, 12)
+            >>> stream
+            000101000010
+        """
+        cdef BitStream stream = cls.__new__(cls)
+        cdef unsigned long long num_bits
+
+        PyObject_GetBuffer(obj, &stream._buffer, PyBUF_SIMPLE)
+        stream._borrowed = True
+        stream._bytes = <unsigned char *>stream._buffer.buf
+        stream._num_bytes = stream._capacity = stream._buffer.len
+        num_bits = 8 * <unsigned long long>stream._buffer.len
+        if offset_bits < 0 or offset_bits > num_bits:
+            raise ValueError("offset_bits is out of range.")
+        if length_bits is None:
+            length_bits = num_bits - offset_bits
+        elif length_bits < 0 or offset_bits + length_bits > num_bits:
+            raise ValueError("length_bits is out of range.")
+        stream._read_offset = offset_bits
+        stream._write_offset = offset_bits + length_bits
+        stream._base_offset = -stream._read_offset
+        return stream
+
+    @staticmethod
+    def open(path, mode="r"):
+        """
+        Open a stream stored in the file `path` (see `MappedBitStream`).
+        """
+        return MappedBitStream(path, mode)
+
+    def __getbuffer__(BitStream self, Py_buffer *buffer, int flags):
+        """
+        Export the (byte-aligned) stream contents as read-only memory.
+
+        The stream cannot be reallocated while its memory is exported.
+        """
+        if self._read_offset % 8 or self._write_offset % 8:
+            raise BufferError("the stream is not byte-aligned.")
+        if flags & PyBUF_WRITABLE:
+            raise BufferError("the stream memory is read-only.")
+        # The consumer may copy the buffer structure: shape and strides 
+        # are stored in a separate memory block.
+        cdef Py_ssize_t *shape = <Py_ssize_t *>malloc(2 * sizeof(Py_ssize_t))
+        if shape == NULL:
+            raise MemoryError()
+        shape[0] = (self._write_offset - self._read_offset) // 8
+        shape[1] = 1
+        buffer.buf = self._bytes + self._read_offset // 8
+        buffer.obj = self
+        buffer.len = shape[0]
+        buffer.readonly = 1
+        buffer.itemsize = 1
+        buffer.format = "B"
+        buffer.ndim = 1
+        buffer.shape = shape
+        buffer.strides = shape + 1
+        buffer.suboffsets = NULL
+        buffer.internal = shape
+        self._exports += 1
+
+    def __releasebuffer__(BitStream self, Py_buffer *buffer):
+        free(buffer.internal)
+        self._exports -= 1
+
+    def compact(BitStream self):
+        """
+        Release the memory used by the data already read from the stream.
+
+        The data that a saved state may still restore is preserved.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream(b"ABCD")
+            >>> _ = stream.read(bytes, 3)
+            >>> stream.compact()
+            >>> stream.read(bytes)
+            'D'
+        """
+        self._compact()
+
+    def reserve(BitStream self, num_bits):
+        """
+        Make sure that `num_bits` more bits can be written into the stream 
+        without reallocation.
+
+        Use this method when the size of the data to write is known in advance.
+        The stream contents are unchanged; the memory borrowed from a buffer
+        is replaced by a private copy.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream(b"AB")
+            >>> _ = stream.read(bytes, 1)
+            >>> stream.reserve(1000)
+            >>> capacity = stream.capacity
+            >>> stream.write(1000 * [True])
+            >>> stream.capacity == capacity
+            True
+        """
+        cdef size_t num_bytes
+        if self._borrowed and \
+           (not self._sharing or self._write_offset < self._view_end):
+            self._own()
+        num_bytes = (self._write_offset + num_bits + 7) // 8
+        if num_bytes > self._capacity:
+            self._resize(num_bytes)
+
+    property capacity:
+        """
+        The number of bits that the stream memory can hold without reallocation.
+
+        The bits already read that the stream still stores are included.
+        """
+        def __get__(BitStream self):
+            return 8 * self._capacity
+
+    def shrink_to_fit(BitStream self):
+        """
+        Release the memory that is allocated but not used by the stream.
+
+        The memory borrowed from a buffer is replaced by a private copy.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream()
+            >>> stream.reserve(1000)
+            >>> stream.write(12 * [True])
+            >>> stream.shrink_to_fit()
+            >>> stream.capacity
+            16
+        """
+        cdef size_t num_bytes
+        if self._borrowed:
+            self._own()
+        num_bytes = (self._write_offset + 7) // 8
+        self._resize(num_bytes)
+        self._num_bytes = num_bytes
+
     cpdef write(BitStream self, data, type=None):
         """
         Encode `data` and append it to the stream.
@@ -309,6 +1134,18 @@ cdef class BitStream:
             write_int64(self, data)
         elif type is float or type is float64:
             write_float64(self, data)
+        elif type is float32:
+            write_float32(self, data)
+        elif type is float16:
+            write_float16(self, data)
+        elif builtins_type(type) is uint:
+            write_uint(self, (<uint>type).num_bits, data, 
+                       (<uint>type).lsb_first)
+        elif builtins_type(type) is sint:
+            write_sint(self, (<sint>type).num_bits, data, 
+                       (<sint>type).lsb_first)
+        elif builtins_type(type) is little_endian:
+            write_little_endian(self, type, data)
         # fallback to the writers dictionary
         elif auto_detect or isinstance(type, builtins_type):
             writer = _writers.get(type)
@@ -397,6 +1234,18 @@ cdef class BitStream:
             return read_int64(self, n)
         elif type is float or type is float64:
             return read_float64(self, n)
+        elif type is float32:
+            return read_float32(self, n)
+        elif type is float16:
+            return read_float16(self, n)
+        elif builtins_type(type) is uint:
+            return read_uint(self, (<uint>type).num_bits, n, 
+                           (<uint>type).lsb_first)
+        elif builtins_type(type) is sint:
+            return read_sint(self, (<sint>type).num_bits, n, 
+                           (<sint>type).lsb_first)
+        elif builtins_type(type) is little_endian:
+            return read_little_endian(self, type, n)
         # fallback to the readers dictionary
         elif isinstance(type, builtins_type):
             reader = _readers.get(type)
@@ -414,6 +1263,81 @@ cdef class BitStream:
                 reader = reader_factory(instance)
                 return reader(self, n)
 
+    cpdef peek(BitStream self, type=None, n=None):
+        """
+        Decode `n` items of data from the start of the stream 
+        without consuming them.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream("AB")
+            >>> stream.peek(uint8)
+            65
+            >>> stream.read(uint8, 2)
+            array([65, 66], dtype=uint8)
+        """
+        cdef unsigned long long read_offset = self._read_offset
+        try:
+            return self.read(type, n)
+        finally:
+            self._read_offset = read_offset
+
+    cpdef read_at(BitStream self, position, type=None, n=None):
+        """
+        Decode `n` items of data at the bit `position` (see `tell`)
+        without consuming them.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream("ABC")
+            >>> stream.read_at(16, uint8)
+            67
+            >>> stream.read(uint8)
+            65
+            >>> stream.read_at(0, uint8)
+            65
+        """
+        cdef unsigned long long read_offset = self._read_offset
+        self.seek(position)
+        try:
+            return self.read(type, n)
+        finally:
+            self._read_offset = read_offset
+
+    cpdef tell(BitStream self):
+        """
+        Return the read position: the number of bits read since 
+        the stream was created.
+        """
+        return self._base_offset + <long long>self._read_offset
+
+    cpdef seek(BitStream self, position):
+        """
+        Move the read position (see `tell`).
+
+        The data before the current position can be read again,
+        unless it has been released by a compaction.
+        Raise a `ValueError` if the position is out of range.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream("AB")
+            >>> stream.read(uint8)
+            65
+            >>> stream.tell()
+            8
+            >>> stream.seek(0)
+            >>> stream.read(uint8, 2)
+            array([65, 66], dtype=uint8)
+        """
+        if position < 0 or position < self._base_offset or \
+           position - self._base_offset > self._write_offset:
+            raise ValueError("position out of range.")
+        self._read_offset = position - self._base_offset
+
     # TODO: implement __unicode__ and change __str__ accordingly
 
     def __str__(self):
@@ -426,25 +1350,102 @@ cdef class BitStream:
             >>> print BitStream("ABC")
             010000010100001001000011
         """
-        bools = []
-        len_ = self._write_offset - self._read_offset
-        for i in range(len_):
-            byte_index, bit_index = divmod(self._read_offset + i, 8)
-            mask = 128 >> bit_index
-            bools.append(bool(self._bytes[byte_index] & mask))
-        return "".join([str(int(bool_)) for bool_ in bools])
+        return self._bits(self._write_offset - self._read_offset)
+
+    cdef str _bits(BitStream self, size_t num_bits):
+        """
+        Represent the first `num_bits` bits of the stream as `'0'` and `'1'`.
+        """
+        cdef bytes string = PyBytes_FromStringAndSize(NULL, num_bits)
+        cdef unsigned char *data = <unsigned char *>PyBytes_AS_STRING(string)
+        cdef size_t i
+        _unpack_bits(data, self._bytes, self._read_offset, num_bits)
+        for i in range(num_bits):
+            data[i] += 48 # ord("0")
+        return string.decode("ascii")
 
     def __repr__(self):
         """
         Represent the stream as a string of `'0'` and `'1'`.
 
+        The representation of streams longer than 4096 bits is truncated.
+
         Usage
         ------------------------------------------------------------------------
 
             >>> BitStream("ABC")
             010000010100001001000011
         """
-        return str(self)
+        cdef unsigned long long num_bits = self._write_offset - self._read_offset
+        if num_bits <= repr_max_bits:
+            return self._bits(num_bits)
+        else:
+            return "{0}... ({1} bits)".format(self._bits(repr_max_bits), num_bits)
+
+    @classmethod
+    def from_bits(cls, bits):
+        """
+        Create a stream from a string of `'0'` and `'1'` (`str` or `bytes`).
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> BitStream.from_bits("0100000101")
+            0100000101
+        """
+        if isinstance(bits, str):
+            try:
+                bits = bits.encode("ascii")
+            except UnicodeEncodeError:
+                raise ValueError("invalid bits string.")
+        array = numpy.frombuffer(bits, dtype=uint8) - 48 # ord("0")
+        if (array > 1).any():
+            raise ValueError("invalid bits string.")
+        return cls(array.view(numpy.bool_), bool)
+
+    def hex(self):
+        """
+        Represent the stream as a string of hexadecimal digits.
+
+        Raise a `ValueError` if the stream length is not a multiple of 4.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> BitStream("AB").hex()
+            '4142'
+        """
+        cdef unsigned long long num_bits = self._write_offset - self._read_offset
+        cdef bytes string
+        if num_bits % 4:
+            raise ValueError("the stream length is not a multiple of 4.")
+        string = PyBytes_FromStringAndSize(NULL, (num_bits + 7) // 8)
+        _copy_bits(<unsigned char *>PyBytes_AS_STRING(string), 0, 
+                   self._bytes, self._read_offset, num_bits)
+        digits = string.hex()
+        return digits[:num_bits // 4]
+
+    @classmethod
+    def fromhex(cls, digits):
+        """
+        Create a stream from a string of hexadecimal digits.
+
+        Whitespace between digits is ignored.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> BitStream.fromhex("41 42 4")
+            01000001010000100100
+        """
+        cdef BitStream stream
+        digits = "".join(digits.split())
+        if len(digits) % 2:
+            stream = cls(bytes.fromhex(digits + "0"))
+            stream._write_offset -= 4
+        else:
+            stream = cls(bytes.fromhex(digits))
+        return stream
 
     # Copy Methods
     # --------------------------------------------------------------------------
@@ -453,6 +1454,8 @@ cdef class BitStream:
         Copy (partially or totally) the stream.
 
         Copies do not consume the stream they read.
+        Large copies share the memory of the stream until the copy is 
+        written, or the stream overwrites the data of the copy.
 
         Arguments
         ------------------------------------------------------------------------
@@ -497,6 +1500,22 @@ cdef class BitStream:
         self._read_offset = read_offset
         return copy
 
+    def __reduce__(BitStream self):
+        """
+        Pickle the stream contents (the saved states are not preserved).
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> import pickle
+            >>> pickle.loads(pickle.dumps(BitStream([True, False, True])))
+            101
+        """
+        cdef size_t start = self._read_offset // 8
+        cdef size_t end = (self._write_offset + 7) // 8
+        data = PyBytes_FromStringAndSize(<char *>self._bytes + start, end - start)
+        return (_unpickle, (data, self._read_offset % 8, len(self)))
+
     def __copy__(self):
         """
         Bitstream shallow copy.
@@ -532,7 +1551,62 @@ cdef class BitStream:
             01000001
         """
         return self.copy()
-        
+
+    # Concatenation
+    # --------------------------------------------------------------------------
+    cpdef extend(BitStream self, BitStream other):
+        """
+        Append the contents of `other` to the stream.
+
+        The stream `other` is not consumed; it may be the stream itself.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream("A")
+            >>> other = BitStream([True, False])
+            >>> stream.extend(other)
+            >>> stream
+            0100000110
+            >>> other
+            10
+        """
+        cdef unsigned long long num_bits
+        num_bits = other._write_offset - other._read_offset
+        self._extend(num_bits)
+        if num_bits < 8 * nogil_threshold:
+            _copy_bits(self._bytes, self._write_offset, 
+                       other._bytes, other._read_offset, num_bits)
+        else:
+            with nogil:
+                _copy_bits(self._bytes, self._write_offset, 
+                           other._bytes, other._read_offset, num_bits)
+        self._write_offset += num_bits
+
+    def __iadd__(self, other):
+        if not isinstance(other, BitStream):
+            return NotImplemented
+        self.extend(other)
+        return self
+
+    def __add__(self, other):
+        if not isinstance(other, BitStream):
+            return NotImplemented
+        return _concatenate([self, other])
+
+    @staticmethod
+    def join(streams):
+        """
+        Concatenate an iterable of streams into a new stream.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> BitStream.join([BitStream("A"), BitStream([True])])
+            010000011
+        """
+        return _concatenate(list(streams))
+
 
     # Length and Comparison
     # --------------------------------------------------------------------------
@@ -593,16 +1667,19 @@ cdef class BitStream:
             True
         """
         # see http://docs.cython.org/src/userguide/special_methods.html
-        cdef boolean equal
+        cdef bint equal
+        cdef BitStream _other
+        cdef unsigned long long num_bits
         if operation not in (2, 3):
             raise NotImplementedError()
         if not isinstance(other, BitStream):
-            equal = false
+            equal = False
         else:
-           s1 = self.copy()
-           s2 = other.copy() # test for type, 
-           equal = all(s1.read(numpy.uint8, len(s1) // 8) == s2.read(numpy.uint8, len(s2) // 8)) and\
-                   (s1.read(bool, len(s1)) == s2.read(bool, len(s2)))
+            _other = other
+            num_bits = self._write_offset - self._read_offset
+            equal = num_bits == _other._write_offset - _other._read_offset and \
+                    _equal_bits(self._bytes, self._read_offset, 
+                                _other._bytes, _other._read_offset, num_bits)
         if operation == 2:
             return equal
         else:
@@ -613,11 +1690,22 @@ cdef class BitStream:
         Compute a bitstream hash 
 
         The computed hash is consistent with the equality operator.
+        It is cached until the stream is modified.
         """
-        copy = self.copy()
-        uint8s = copy.read(numpy.uint8, len(self) // 8)
-        bools  = copy.read(bool, len(copy))
-        return hash((hashlib.sha1(uint8s).hexdigest(), tuple(bools)))
+        cdef Py_hash_t hash_
+        if self._hashed and \
+           self._hash_read_offset == self._read_offset and \
+           self._hash_write_offset == self._write_offset:
+            return self._hash
+        hash_ = <Py_hash_t>_hash_bits(self._bytes, self._read_offset, 
+                                      self._write_offset - self._read_offset)
+        if hash_ == -1: # reserved for errors
+            hash_ = -2
+        self._hash = hash_
+        self._hash_read_offset = self._read_offset
+        self._hash_write_offset = self._write_offset
+        self._hashed = True
+        return hash_
 
 
     # Snapshots
@@ -626,46 +1714,98 @@ cdef class BitStream:
         """
         Return a `State` instance
         """
+        cdef _Snapshot *snapshot = NULL
+        cdef _Snapshot *snapshots
+        cdef size_t capacity
         cdef State state
-        state = self._states[-1]
-        if state._read_offset != self._read_offset or \
-           state._write_offset != self._write_offset:
-            self._state_id = self._state_id + 1
-            # Fast instantiation (<http://docs.cython.org/src/userguide/extension_types.html>)
-            state = State.__new__(State)
-            # For some reason, setting the state data in constructors would
-            # trigger the (slow) conversion of these data to Python objects.
-            # That may have been corrected in late 0.19.x versions of Cython.
-            state._stream = self
-            state._read_offset = self._read_offset
-            state._write_offset = self._write_offset
-            state._id = self._state_id
-            self._states.append(state)
+
+        if self._num_snapshots:
+            snapshot = &self._snapshots[self._num_snapshots - 1]
+        if snapshot == NULL or \
+           snapshot.read_offset != self._read_offset or \
+           snapshot.write_offset != self._write_offset:
+            if self._num_snapshots == self._snapshots_capacity:
+                capacity = max(2 * self._snapshots_capacity, 8)
+                snapshots = <_Snapshot *>realloc(self._snapshots, 
+                                                 capacity * sizeof(_Snapshot))
+                if snapshots == NULL:
+                    raise MemoryError()
+                self._snapshots = snapshots
+                self._snapshots_capacity = capacity
+            snapshot = &self._snapshots[self._num_snapshots]
+            self._num_snapshots += 1
+            self._snapshot_id += 1
+            snapshot.read_offset = self._read_offset
+            snapshot.write_offset = self._write_offset
+            snapshot.id = self._snapshot_id
+            snapshot.refs = 0
+        # Fast instantiation (<http://docs.cython.org/src/userguide/extension_types.html>)
+        state = State.__new__(State)
+        state._stream = self
+        state._index = self._num_snapshots - 1
+        state._id = snapshot.id
+        snapshot.refs += 1
         return state
 
     cpdef restore(BitStream self, State state):
         """
         Restore a previous stream state.
 
+        The snapshots saved after `state` are forgotten.
         Raise a `ValueError` if the state is invalid.
         """
+        cdef _Snapshot *snapshot
         if self is not state._stream:
             raise ValueError("the state does not belong to this stream.")
-        # The restore action may fail, so we work on a copy of the saved states.
-        states = copy.copy(self._states)
-        while states:
-            if state == <State>states[-1]:
-                self._read_offset  = state._read_offset
-                self._write_offset = state._write_offset
-                self._states = states
-                break
-            else:
-                states.pop()
-        else:
+        if state._index >= self._num_snapshots or \
+           self._snapshots[state._index].id != state._id:
             raise ValueError("this state is not saved in the stream.")
+        snapshot = &self._snapshots[state._index]
+        self._read_offset  = snapshot.read_offset
+        self._write_offset = snapshot.write_offset
+        self._num_snapshots = state._index + 1
+
+    cdef void _release(BitStream self, State state) noexcept:
+        """
+        Forget the reference of `state` to its snapshot, 
+        then drop the snapshots at the top of the stack 
+        that no state refers to.
+        """
+        if state._index < self._num_snapshots and \
+           self._snapshots[state._index].id == state._id:
+            self._snapshots[state._index].refs -= 1
+            while self._num_snapshots and \
+                  self._snapshots[self._num_snapshots - 1].refs == 0:
+                self._num_snapshots -= 1
+
+    def transaction(self):
+        """
+        Return a context manager that saves the stream state on entry
+        and restores it if an exception is raised.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> stream = BitStream("AB")
+            >>> try:
+            ...     with stream.transaction():
+            ...         _ = stream.read(uint8)
+            ...         raise ValueError()
+            ... except ValueError:
+            ...     pass
+            >>> stream.read(uint8)
+            65
+        """
+        cdef _Transaction transaction = _Transaction.__new__(_Transaction)
+        transaction._stream = self
+        return transaction
 
     def __dealloc__(self):
-        free(self._bytes)
+        if self._borrowed:
+            PyBuffer_Release(&self._buffer)
+        else:
+            free(self._bytes)
+        free(self._snapshots)
 
 
 # Types Registration
@@ -705,14 +1845,216 @@ cdef class State: # treat as opaque and immutable.
         if operation not in (2, 3):
             raise NotImplementedError()
         equal = self._stream is other._stream and \
-                self._read_offset == other._read_offset and \
-                self._write_offset == other._write_offset and \
+                self._index == other._index and \
                 self._id == other._id
         if operation == 2:
             return equal
         else:
             return not equal
 
+    def __dealloc__(self):
+        if self._stream is not None:
+            self._stream._release(self)
+
+cdef class _Transaction:
+    """
+    Context manager of `BitStream.transaction`.
+    """
+    def __enter__(self):
+        self._state = self._stream.save()
+        return self._state
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._stream.restore(self._state)
+        self._state = None
+        return False
+
+
+# Memory-Mapped Files
+# ------------------------------------------------------------------------------
+cdef class MappedBitStream(BitStream):
+    """
+    Bitstream stored in a memory-mapped file.
+
+    Arguments
+    ----------------------------------------------------------------------------
+
+      - `path`: the file path.
+
+      - `mode`: `"r"` (read the file, the default), `"w"` (truncate the file 
+        or create it, then write) or `"a"` (read the file and append to it).
+
+      - `chunk_size`: the granularity in bytes of the file growth.
+
+    The file contents are paged in lazily by the operating system, 
+    as they are read. In the writable modes, the file grows by chunks 
+    as the stream is written and is truncated to the size of the stream
+    when it is closed.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> with BitStream.open("data.bin", "w") as stream:
+        ...     stream.write(b"ABC")
+        >>> with BitStream.open("data.bin") as stream:
+        ...     stream.read(bytes)
+        'ABC'
+    """
+    def __init__(self, path, mode="r", chunk_size=16 * 2**20):
+        cdef size_t size
+        if mode not in ("r", "w", "a"):
+            raise ValueError("invalid mode {0!r}.".format(mode))
+        if chunk_size <= 0:
+            raise ValueError("chunk_size should be positive.")
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self._writable = mode != "r"
+        self._file = open(path, {"r": "rb", "w": "w+b", "a": "a+b"}[mode])
+        size = os.fstat(self._file.fileno()).st_size
+        if size > 0:
+            self._map(size)
+        self._num_bytes = size
+        self._write_offset = 8 * <unsigned long long>size
+
+    cdef int _map(MappedBitStream self, size_t size) except -1:
+        """
+        Map the first `size` bytes of the file into memory.
+        """
+        cdef int flags = PyBUF_WRITABLE if self._writable else PyBUF_SIMPLE
+        access = mmap.ACCESS_WRITE if self._writable else mmap.ACCESS_READ
+        self._mmap = mmap.mmap(self._file.fileno(), size, access=access)
+        PyObject_GetBuffer(self._mmap, &self._map_buffer, flags)
+        self._mapped = True
+        self._bytes = <unsigned char *>self._map_buffer.buf
+        self._capacity = size
+        return 0
+
+    cdef int _unmap(MappedBitStream self) except -1:
+        """
+        Unmap the file from memory (its contents are flushed first).
+        """
+        if self._mapped:
+            PyBuffer_Release(&self._map_buffer)
+            self._mapped = False
+            if self._writable:
+                self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+        self._bytes = NULL
+        self._capacity = 0
+        return 0
+
+    cdef int _check_open(MappedBitStream self) except -1:
+        if self._closed:
+            raise ValueError("I/O operation on closed file.")
+        return 0
+
+    cdef int _check_writable(MappedBitStream self) except -1:
+        self._check_open()
+        if not self._writable:
+            raise io.UnsupportedOperation("the stream is read-only.")
+        return 0
+
+    cpdef int _extend(MappedBitStream self, size_t num_bits) except -1:
+        """
+        Make room for `num_bits` extra bits into the stream.
+
+        The file size grows by multiples of `chunk_size`.
+        """
+        cdef size_t num_bytes
+        self._check_writable()
+        self._hashed = False
+        num_bytes = (self._write_offset + num_bits + 7) // 8
+        if num_bytes > self._capacity:
+            self._resize(
+              (num_bytes + self.chunk_size - 1) // self.chunk_size * self.chunk_size
+            )
+        if num_bytes > self._num_bytes:
+            self._num_bytes = num_bytes
+        return 0
+
+    cdef int _resize(MappedBitStream self, size_t capacity) except -1:
+        """
+        Resize the file (and its mapping) to exactly `capacity` bytes.
+        """
+        self._check_writable()
+        if self._exports:
+            raise BufferError("the stream memory is exported.")
+        self._unmap()
+        self._file.truncate(capacity)
+        if capacity > 0:
+            self._map(capacity)
+        return 0
+
+    cdef int _compact(MappedBitStream self) except -1:
+        # The consumed data is not removed from the file.
+        return 0
+
+    cpdef write(MappedBitStream self, data, type=None):
+        """
+        Encode `data` and append it to the stream (see `BitStream.write`).
+        """
+        self._check_writable()
+        BitStream.write(self, data, type)
+
+    cpdef read(MappedBitStream self, type=None, n=None):
+        """
+        Decode and consume data from the stream (see `BitStream.read`).
+        """
+        self._check_open()
+        return BitStream.read(self, type, n)
+
+    def flush(MappedBitStream self):
+        """
+        Write the changes of the stream to the file.
+        """
+        if self._mapped and self._writable:
+            self._mmap.flush()
+
+    def close(MappedBitStream self):
+        """
+        Close the stream and its file.
+
+        In the writable modes, the file is truncated to the size of the stream
+        (rounded up to a whole number of bytes).
+        """
+        if self._closed:
+            return
+        if self._exports:
+            raise BufferError("the stream memory is exported.")
+        self._unmap()
+        if self._writable:
+            self._file.truncate((self._write_offset + 7) // 8)
+        self._file.close()
+        self._closed = True
+        self._read_offset = self._write_offset = 0
+        self._num_bytes = 0
+
+    property closed:
+        def __get__(MappedBitStream self):
+            return self._closed
+
+    def __enter__(MappedBitStream self):
+        return self
+
+    def __exit__(MappedBitStream self, *exc_info):
+        self.close()
+
+    def __del__(MappedBitStream self):
+        # The file is truncated to the size of the stream, as in `close`.
+        if self._file is not None and not self._closed:
+            warnings.warn("unclosed stream {0!r}".format(self._file.name),
+                          ResourceWarning, source=self)
+            self.close()
+
+    def __dealloc__(MappedBitStream self):
+        # The memory is not owned by the stream.
+        if self._mapped:
+            PyBuffer_Release(&self._map_buffer)
+            self._mapped = False
+        self._bytes = NULL
+
 
 # Bool Reader / Writer
 # ------------------------------------------------------------------------------
@@ -722,7 +2064,6 @@ cpdef read_bool(BitStream stream, n=None):
     """
     cdef unsigned char *_bytes
     cdef unsigned char mask
-    cdef unsigned long i, _n
     cdef size_t byte_index
     cdef unsigned char bit_index
     
@@ -736,18 +2077,30 @@ cpdef read_bool(BitStream stream, n=None):
         stream._read_offset += 1
         return bool(_bytes[byte_index] & mask)
 
+    return read_bool_array(stream, n).tolist()
+
+cpdef read_bool_array(BitStream stream, n=None):
+    """
+    Read bools from a stream as NumPy `bool_` data.
+    """
+    cdef size_t num_bools
+    cdef np.ndarray bools
+    cdef unsigned char *data
+
+    if n is None:
+        return numpy.bool_(read_bool(stream))
+
     if n > len(stream):
         raise ReadError("end of the stream")
+    num_bools = n
+    bools = numpy.empty(num_bools, dtype=numpy.bool_)
+    data = <unsigned char *>np.PyArray_DATA(bools)
+    if num_bools < 8 * nogil_threshold:
+        _unpack_bits(data, stream._bytes, stream._read_offset, num_bools)
     else:
-        _n = n
-
-    bools = _n * [False]
-    for i in range(_n):
-        byte_index = (stream._read_offset + i ) // 8
-        bit_index  = (stream._read_offset + i ) - 8 * byte_index            
-        mask = 128 >> bit_index
-        bools[i] = bool(_bytes[byte_index] & mask)
-    stream._read_offset += _n
+        with nogil:
+            _unpack_bits(data, stream._bytes, stream._read_offset, num_bools)
+    stream._read_offset += num_bools
     return bools
 
 cpdef write_bool(BitStream stream, bools):
@@ -755,6 +2108,7 @@ cpdef write_bool(BitStream stream, bools):
     Write bools into a stream.
     """
     cdef unsigned char *_bytes
+    cdef unsigned char *data
     cdef unsigned char _byte
     cdef unsigned char mask
     cdef unsigned long long i, n
@@ -765,10 +2119,10 @@ cpdef write_bool(BitStream stream, bools):
     cdef type _type
     cdef np.uint8_t _np_bool
 
-    offset = stream._write_offset
     if bools is false or bools is zero: # False or 0 (if cached).
         stream._extend(1)
         _bytes = stream._bytes
+        offset = stream._write_offset
         byte_index = offset >> 3
         bit_index  = offset & 7
         mask = 128 >> bit_index
@@ -777,6 +2131,7 @@ cpdef write_bool(BitStream stream, bools):
     elif bools is true or bools is one: # True or 1 (if cached).
         stream._extend(1)
         _bytes = stream._bytes
+        offset = stream._write_offset
         byte_index = offset >> 3
         bit_index  = offset & 7
         mask = 128 >> bit_index
@@ -789,6 +2144,7 @@ cpdef write_bool(BitStream stream, bools):
             n = len(_bools)
             stream._extend(n)
             _bytes = stream._bytes
+            offset = stream._write_offset
             i = 0
             for _bool in _bools: # faster than a loop on i
                 byte_index = (offset + i) >> 3
@@ -803,10 +2159,24 @@ cpdef write_bool(BitStream stream, bools):
                     _bytes[byte_index] = _byte & ~mask
                 i += 1
             stream._write_offset += n
+        elif _type is ndarray and bools.ndim == 1 and bools.dtype.kind in "biufc":
+            if bools.dtype.kind != "b":
+                bools = (bools != 0)
+            bools = numpy.ascontiguousarray(bools)
+            n = len(bools)
+            stream._extend(n)
+            data = <unsigned char *>np.PyArray_DATA(bools)
+            if n < 8 * nogil_threshold:
+                _pack_bits(stream._bytes, stream._write_offset, data, n)
+            else:
+                with nogil:
+                    _pack_bits(stream._bytes, stream._write_offset, data, n)
+            stream._write_offset += n
         elif _type is ndarray:
             n = len(bools)
             stream._extend(n)
             _bytes = stream._bytes
+            offset = stream._write_offset
             i = 0
             for _bool in bools:
                 byte_index = (offset + i) >> 3
@@ -822,6 +2192,7 @@ cpdef write_bool(BitStream stream, bools):
         elif bools:
             stream._extend(1)
             _bytes = stream._bytes
+            offset = stream._write_offset
             byte_index = offset >> 3
             bit_index  = offset & 7
             mask = 128 >> bit_index
@@ -830,6 +2201,7 @@ cpdef write_bool(BitStream stream, bools):
         else:
             stream._extend(1)
             _bytes = stream._bytes
+            offset = stream._write_offset
             byte_index = offset >> 3
             bit_index  = offset & 7
             mask = 128 >> bit_index
@@ -837,146 +2209,149 @@ cpdef write_bool(BitStream stream, bools):
             stream._write_offset += 1
 
 register(bool, reader=read_bool, writer=write_bool)
-register(numpy.bool_, reader=read_bool, writer=write_bool)
+register(numpy.bool_, reader=read_bool_array, writer=write_bool)
+
+cpdef read_bitmap(BitStream stream, n):
+    """
+    Read `n` bits from a stream as a packed array of unsigned 8-bit integers.
+
+    The layout of the bitmap is the one of `numpy.packbits`: 
+    its trailing bits are zeros.
+    """
+    cdef size_t num_bits
+    cdef np.ndarray bitmap
+    cdef unsigned char *data
+
+    if n > len(stream):
+        raise ReadError("end of the stream")
+    num_bits = n
+    bitmap = numpy.zeros((num_bits + 7) // 8, dtype=uint8)
+    data = <unsigned char *>np.PyArray_DATA(bitmap)
+    if num_bits < 8 * nogil_threshold:
+        _copy_bits(data, 0, stream._bytes, stream._read_offset, num_bits)
+    else:
+        with nogil:
+            _copy_bits(data, 0, stream._bytes, stream._read_offset, num_bits)
+    stream._read_offset += num_bits
+    return bitmap
+
+cpdef write_bitmap(BitStream stream, bitmap, n=None):
+    """
+    Write the first `n` bits of a packed bitmap into a stream.
+
+    The bitmap is a 1-dim. array of unsigned 8-bit integers (or a `bytes` 
+    object); all its bits are written when `n` is `None`.
+    """
+    cdef size_t num_bits
+    cdef np.ndarray array
+    cdef unsigned char *data
+
+    if isinstance(bitmap, bytes):
+        array = numpy.frombuffer(bitmap, dtype=uint8)
+    else:
+        array = numpy.ascontiguousarray(bitmap, dtype=uint8)
+    if n is None:
+        num_bits = 8 * len(array)
+    elif n > 8 * len(array):
+        raise WriteError("not enough bits in the bitmap")
+    else:
+        num_bits = n
+    stream._extend(num_bits)
+    data = <unsigned char *>np.PyArray_DATA(array)
+    if num_bits < 8 * nogil_threshold:
+        _copy_bits(stream._bytes, stream._write_offset, data, 0, num_bits)
+    else:
+        with nogil:
+            _copy_bits(stream._bytes, stream._write_offset, data, 0, num_bits)
+    stream._write_offset += num_bits
 
 
-# Integers Type Readers and Writers: signed/unsigned, 8/16/32 bits integers
+# Integers Type Readers and Writers: signed/unsigned, 8/16/32/64 bits integers
 # ------------------------------------------------------------------------------
+cdef object _read_array(BitStream stream, n, type dtype, unsigned int width,
+                        bint little=False):
+    """
+    Read a 1-dim. array of `n` big-endian (or little-endian) integers 
+    of `width` bytes.
+    """
+    cdef size_t num_items
+    cdef np.ndarray array
+    cdef unsigned char *data
+
+    if len(stream) < 8 * width * n:
+        raise ReadError("end of stream")
+    num_items = n
+    array = numpy.empty(num_items, dtype=dtype)
+    data = <unsigned char *>np.PyArray_DATA(array)
+    if width * num_items < nogil_threshold:
+        _read_words(data, stream._bytes, stream._read_offset, 
+                    num_items, width, little)
+    else:
+        with nogil:
+            _read_words(data, stream._bytes, stream._read_offset, 
+                        num_items, width, little)
+    stream._read_offset += 8 * width * num_items
+    return array
+
+cdef int _write_array(BitStream stream, np.ndarray array, unsigned int width,
+                      bint little=False) except -1:
+    """
+    Write a 1-dim. array of integers of `width` bytes as big-endian 
+    (or little-endian) data.
+    """
+    cdef size_t num_items
+    cdef unsigned char *data
+
+    array = numpy.ascontiguousarray(array)
+    num_items = array.shape[0]
+    stream._extend(8 * width * num_items)
+    data = <unsigned char *>np.PyArray_DATA(array)
+    if width * num_items < nogil_threshold:
+        _write_words(stream._bytes, stream._write_offset, 
+                     data, num_items, width, little)
+    else:
+        with nogil:
+            _write_words(stream._bytes, stream._write_offset, 
+                         data, num_items, width, little)
+    stream._write_offset += 8 * width * num_items
+    return 0
+
 cpdef write_uint8(BitStream stream, data):
-    cdef unsigned char *_bytes
-    cdef size_t num_bytes, byte_index, i
-    cdef unsigned char bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, _uint8
-    cdef type _type, _dtype
-    cdef object iterator
-    cdef int iterable
+    """
+    Write unsigned 8-bit integers into a stream.
+    """
+    cdef type _type
     cdef unsigned char _byte
-    cdef np.ndarray[np.uint8_t, ndim=1] array
-    cdef np.uint8_t uint8_
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
     
     _type = type(data)
-    
     if _type is list or _type is np.ndarray: 
         array = numpy.array(data, dtype=uint8, copy=False, ndmin=1)
-        num_bytes = len(array)
-        stream._extend(8 * num_bytes)
-        _bytes = stream._bytes
-        i = 0
-        if bit_index == 0:
-            for i in range(num_bytes):
-                _bytes[byte_index + i] = <unsigned char>(array[i])
-        else:
-            for i in range(num_bytes):
-                uint8_ = <unsigned char>(array[i])
-                _byte = (<unsigned char>uint8_) >> bit_index
-                _bytes[byte_index + i] = (_bytes[byte_index + i] & mask1) | _byte
-                _byte = ((<unsigned char>uint8_) << bit_index_c) & 255
-                _bytes[byte_index + i + 1]  = \
-                    (_bytes[byte_index + i + 1] & mask2) | _byte
-        stream._write_offset += 8 * num_bytes
+        _write_array(stream, array, 1)
     else: # if data is not a list or an array, it should be an scalar.
-        stream._extend(8)
-        _bytes = stream._bytes
         if _type is uint8:
             _byte = <unsigned char>(data)
         else:
             _byte = uint8(data)
-        if bit_index == 0:
-            _bytes[byte_index] = _byte
-        else:
-            _uint8 = _byte >> bit_index
-            _bytes[byte_index] = (_bytes[byte_index] & mask1) | _uint8
-            _uint8 = (_byte << bit_index_c) & 255
-            _bytes[byte_index + 1]  = \
-                (_bytes[byte_index + 1] & mask2) | _uint8
+        stream._extend(8)
+        _put_bits(stream._bytes, stream._write_offset, 8, _byte)
         stream._write_offset += 8           
      
-@cython.boundscheck(False) # TODO: generalize
 cpdef _write_uint8(BitStream stream, np.ndarray[np.uint8_t, ndim=1] uint8s):
     """
     Write a 1-dim. array of unsigned 8-bit integers into a stream.
     """
-    cdef unsigned char *_bytes
-    cdef size_t num_bytes, byte_index, i
-    cdef unsigned char bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, _uint8
-          
-    num_bytes = len(uint8s)
-    stream._extend(8 * num_bytes)
-    _bytes = stream._bytes        
-    
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-    
-    if bit_index == 0:
-        for i in range(num_bytes):
-            _bytes[byte_index + i] = <unsigned char>uint8s[i]
-    else:
-        for i in range(num_bytes):
-            _uint8 = (<unsigned char>uint8s[i]) >> bit_index
-            _bytes[byte_index + i] = (_bytes[byte_index + i] & mask1) | _uint8
-            _uint8 = ((<unsigned char>uint8s[i]) << bit_index_c) & 255
-            _bytes[byte_index + i + 1]  = \
-                (_bytes[byte_index + i + 1] & mask2) | _uint8            
-    stream._write_offset += 8 * num_bytes         
+    _write_array(stream, uint8s, 1)
      
 cpdef read_uint8(BitStream stream, n=None):
     """
     Read unsigned 8-bit integers from a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t i, byte_index
-    cdef unsigned char bit_index, bit_index_c
-    cdef unsigned char mask1, mask2
-    cdef unsigned char _byte
-    cdef size_t num_bytes
-    cdef np.ndarray[np.uint8_t, ndim=1] uint8s
-
-    _bytes = stream._bytes
-    byte_index = stream._read_offset // 8
-    bit_index  = stream._read_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-    
     if n is None:
         if len(stream) < 8:
             raise ReadError("end of stream")
         stream._read_offset += 8
-        if bit_index == 0:
-            return uint8(_bytes[byte_index])
-        else:
-          bit_index_c = 8 - bit_index
-          mask1 = 255 >> bit_index
-          mask2 = 255 - mask1
-          _byte = ((_bytes[byte_index    ] & mask1) << bit_index) + \
-                  ((_bytes[byte_index + 1] & mask2) >> bit_index_c)         
-          return uint8(_byte)
-    
-    if len(stream) < 8 * n:
-        raise ReadError("end of stream")
-    num_bytes = min(n, len(stream) // 8)
-    uint8s = numpy.zeros(num_bytes, dtype=uint8)
-    if bit_index == 0:
-        for i in range(num_bytes):
-            uint8s[i] = _bytes[byte_index + i]
-    else:
-        mask1 = 255 >> bit_index
-        mask2 = 255 - mask1
-        for i in range(num_bytes):
-            _byte = ((_bytes[byte_index + i  ] & mask1) << bit_index) + \
-                    ((_bytes[byte_index + i+1] & mask2) >> bit_index_c)
-            uint8s[i] = _byte
-    stream._read_offset += 8 * num_bytes
-    return uint8s
+        return uint8(_get_bits(stream._bytes, stream._read_offset - 8, 8))
+    return _read_array(stream, n, uint8, 1)
     
 register(uint8, reader=read_uint8, writer=write_uint8)
 
@@ -991,39 +2366,15 @@ cpdef _write_int8(BitStream stream, np.ndarray[np.int8_t, ndim=1] int8s):
     """
     Write a 1-dim. array of signed 8-bit integers into a stream.
     """
-    cdef unsigned char *_bytes
-    cdef size_t num_bytes, byte_index, i
-    cdef unsigned char bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, int8
-
-    num_bytes = len(int8s)
-    stream._extend(8 * num_bytes)
-    _bytes = stream._bytes
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-    
-    if bit_index == 0:
-        for i in range(num_bytes):
-            _bytes[byte_index + i] = <unsigned char>int8s[i]
-    else:
-        for i in range(num_bytes):
-            int8 = (<unsigned char>int8s[i]) >> bit_index
-            _bytes[byte_index + i] = (_bytes[byte_index + i] & mask1) | int8
-            int8 = ((<unsigned char>int8s[i]) << bit_index_c) & 255
-            _bytes[byte_index + i + 1]  = \
-                (_bytes[byte_index + i + 1] & mask2) | int8            
-    stream._write_offset += 8 * num_bytes
+    _write_array(stream, int8s, 1)
 
 cpdef read_int8(BitStream stream, n=None):
     """
     Read signed 8-bit integers from a stream.
     """
-    return read_uint8(stream, n).astype("int8")
+    if n is None:
+        return read_uint8(stream).astype(int8)
+    return read_uint8(stream, n).view(int8)
 
 register(numpy.int8, reader=read_int8, writer=write_int8)
 
@@ -1031,60 +2382,12 @@ cpdef read_uint16(BitStream stream, n=None):
     """
     Read unsigned 16-bit integers from a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t byte_index
-    cdef unsigned long bit_length, 
-    cdef unsigned char bit_index, bit_index_c
-    cdef unsigned char mask1, mask2
-    cdef unsigned int _uint16
-    cdef size_t i
-    cdef size_t num_uint16s
-
-    _bytes = stream._bytes        
-    byte_index = stream._read_offset // 8
-    bit_index  = stream._read_offset - 8 * byte_index
-    
     if n is None:
         if len(stream) < 16:
             raise ReadError("end of stream")
         stream._read_offset += 16
-        if bit_index == 0:
-            _uint16 = (_bytes[byte_index] << 8) + _bytes[byte_index + 1]
-            return uint16(_uint16)
-        else:
-            bit_index_c = 8 - bit_index
-            mask1 = 255 >> bit_index
-            mask2 = 255 - mask1
-            _uint16 = ((_bytes[byte_index    ] & mask1) << bit_index) + \
-                      ((_bytes[byte_index + 1] & mask2) >> bit_index_c)  
-            _uint16 = _uint16 << 8
-            _uint16 += ((_bytes[byte_index + 1] & mask1) << bit_index) + \
-                      ((_bytes[byte_index + 2] & mask2) >> bit_index_c)
-            return uint16(_uint16)
-
-    if len(stream) < 16 * n:
-        raise ReadError("end of stream")
-
-    num_uint16s = min(n, len(stream) / 16)
-    uint16s = numpy.zeros(num_uint16s, dtype=uint16)
-    if bit_index == 0:
-        for i in range(num_uint16s):
-            _uint16 = (_bytes[byte_index + 2 * i    ] << 8) + \
-                       _bytes[byte_index + 2 * i + 1]
-            uint16s[i] = _uint16
-    else:
-        bit_index_c = 8 - bit_index
-        mask1 = 255 >> bit_index
-        mask2 = 255 - mask1
-        for i in range(num_uint16s):
-            _uint16 = ((_bytes[byte_index + 2*i  ] & mask1) << bit_index) + \
-                      ((_bytes[byte_index + 2*i+1] & mask2) >> bit_index_c) 
-            _uint16 = _uint16 << 8
-            _uint16 += ((_bytes[byte_index + 2*i+1] & mask1) << bit_index) + \
-                       ((_bytes[byte_index + 2*i+2] & mask2) >> bit_index_c)
-            uint16s[i] = _uint16
-    stream._read_offset += 16 * num_uint16s
-    return uint16s
+        return uint16(_get_bits(stream._bytes, stream._read_offset - 16, 16))
+    return _read_array(stream, n, uint16, 2)
     
 cpdef write_uint16(BitStream stream, data):
     """
@@ -1097,43 +2400,7 @@ cpdef _write_uint16(BitStream stream, np.ndarray[np.uint16_t, ndim=1] uint16s):
     """
     Write a 1-dim. array of unsigned 16-bit integers into a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t i, num_uint16s, byte_index
-    cdef unsigned long bit_length, bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, base, byte
-                            
-    num_uint16s = len(uint16s)
-    stream._extend(16 * num_uint16s)
-    _bytes = stream._bytes
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-   
-    if bit_index == 0:
-        for i in range(num_uint16s):
-            _bytes[byte_index + 2*i]   = <unsigned char>(uint16s[i] >>  8)
-            _bytes[byte_index + 2*i+1] = <unsigned char>(uint16s[i] & 255)
-    else:
-        for i in range(num_uint16s):
-            base = uint16s[i] >> 8
-            byte = (<unsigned char>base) >> bit_index
-            _bytes[byte_index + 2*i] = \
-                (_bytes[byte_index + 2*i] & mask1) | byte
-            byte = ((<unsigned char>base) << bit_index_c) & 255
-            base = uint16s[i] & 255
-            _bytes[byte_index + 2*i+1] = \
-                (_bytes[byte_index + 2*i+1] & mask2) | byte   
-            byte = (<unsigned char>base) >> bit_index
-            _bytes[byte_index + 2*i+1] = \
-                (_bytes[byte_index + 2*i+1] & mask1) | byte
-            byte = ((<unsigned char>base) << bit_index_c) & 255
-            _bytes[byte_index + 2*i+2] = \
-                (_bytes[byte_index + 2*i+2] & mask2) | byte                   
-    stream._write_offset += 16 * num_uint16s    
+    _write_array(stream, uint16s, 2)
     
 register(uint16, reader=read_uint16, writer=write_uint16)
 
@@ -1141,7 +2408,9 @@ cpdef read_int16(BitStream stream, n=None):
     """
     Read signed 16-bit integers from a stream.
     """
-    return stream.read(numpy.uint16, n).astype("int16")
+    if n is None:
+        return read_uint16(stream).astype(int16)
+    return read_uint16(stream, n).view(int16)
 
 cpdef write_int16(BitStream stream, data):
     """
@@ -1154,43 +2423,7 @@ cpdef _write_int16(BitStream stream, np.ndarray[np.int16_t, ndim=1] int16s):
     """
     Write a 1-dim. array of signed 16-bit integers into a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t i, num_int16s, byte_index
-    cdef unsigned long bit_length, bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, base, byte
-                            
-    num_int16s = len(int16s)
-    stream._extend(16 * num_int16s)
-    _bytes = stream._bytes
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-    
-    if bit_index == 0:
-        for i in range(num_int16s):
-            _bytes[byte_index + 2*i]   = <unsigned char>(int16s[i] >>  8)
-            _bytes[byte_index + 2*i+1] = <unsigned char>(int16s[i] & 255)               
-    else:
-        for i in range(num_int16s):
-            base = int16s[i] >> 8
-            byte = (<unsigned char>base) >> bit_index
-            _bytes[byte_index + 2*i] = \
-                (_bytes[byte_index + 2*i] & mask1) | byte
-            byte = ((<unsigned char>base) << bit_index_c) & 255
-            base = int16s[i] & 255
-            _bytes[byte_index + 2*i+1] = \
-                (_bytes[byte_index + 2*i+1] & mask2) | byte   
-            byte = (<unsigned char>base) >> bit_index
-            _bytes[byte_index + 2*i+1] = \
-                (_bytes[byte_index + 2*i+1] & mask1) | byte
-            byte = ((<unsigned char>base) << bit_index_c) & 255
-            _bytes[byte_index + 2*i+2] = \
-                (_bytes[byte_index + 2*i+2] & mask2) | byte                   
-    stream._write_offset += 16 * num_int16s
+    _write_array(stream, int16s, 2)
 
 register(numpy.int16, reader=read_int16, writer=write_int16)
 
@@ -1198,66 +2431,12 @@ cpdef read_uint32(BitStream stream, n=None):
     """
     Read unsigned 32-bit integers from a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t byte_index
-    cdef unsigned long bit_length, 
-    cdef unsigned char bit_index, bit_index_c
-    cdef unsigned char mask1, mask2
-    cdef unsigned long uint32
-    cdef size_t i
-    cdef unsigned char s
-    cdef size_t num_uint32s
-
-    _bytes = stream._bytes
-    byte_index = stream._read_offset // 8
-    bit_index  = stream._read_offset - 8 * byte_index
-    
     if n is None:
         if len(stream) < 32:
             raise ReadError("end of stream")
         stream._read_offset += 32
-        if bit_index == 0:
-            uint32 = (_bytes[byte_index    ] << 24) + \
-                     (_bytes[byte_index + 1] << 16) + \
-                     (_bytes[byte_index + 2] <<  8) + \
-                     (_bytes[byte_index + 3]      )
-            return numpy.uint32(uint32)
-        else:
-            bit_index_c = 8 - bit_index
-            mask1 = 255 >> bit_index
-            mask2 = 255 - mask1
-            uint32 = 0
-            for s in range(4):
-                uint32 = uint32 << 8
-                uint32 += ((_bytes[byte_index + s    ] & mask1) << bit_index) + \
-                          ((_bytes[byte_index + s + 1] & mask2) >> bit_index_c)
-            return numpy.uint32(uint32)
-
-    if len(stream) < 32 * n:
-        raise ReadError("end of stream")
-
-    num_uint32s = min(n, len(stream) / 32)
-    uint32s = numpy.zeros(num_uint32s, dtype=numpy.uint32)
-    if bit_index == 0:
-        for i in range(num_uint32s):
-            uint32 = (<unsigned long>(_bytes[byte_index + 4*i  ]) << 24) + \
-                     (<unsigned long>(_bytes[byte_index + 4*i+1]) << 16) + \
-                     (<unsigned long>(_bytes[byte_index + 4*i+2]) <<  8) + \
-                     (<unsigned long>(_bytes[byte_index + 4*i+3])      )
-            uint32s[i] = uint32
-    else:
-        bit_index_c = 8 - bit_index
-        mask1 = 255 >> bit_index
-        mask2 = 255 - mask1
-        for i in range(num_uint32s):
-            uint32 = 0
-            for s in range(4):
-                uint32 = uint32 << 8
-                uint32 = ((_bytes[byte_index + 4*i+s  ] & mask1) << bit_index) + \
-                         ((_bytes[byte_index + 4*i+s+1] & mask2) >> bit_index_c)
-            uint32s[i] = uint32
-    stream._read_offset += 32 * num_uint32s
-    return uint32s
+        return uint32(_get_bits(stream._bytes, stream._read_offset - 32, 32))
+    return _read_array(stream, n, uint32, 4)
 
 cpdef write_uint32(BitStream stream, data):
     """
@@ -1270,39 +2449,7 @@ cpdef _write_uint32(BitStream stream, np.ndarray[np.uint32_t, ndim=1] uint32s):
     """
     Write a 1-dim. arrray of unsigned 32-bit integers into a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t i, num_uint32s, byte_index
-    cdef unsigned long bit_length, bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, base, byte
-                            
-    num_uint32s = len(uint32s)
-    stream._extend(32 * num_uint32s)
-    _bytes = stream._bytes
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-    
-    if bit_index == 0:
-        for i in range(num_uint32s):
-            _bytes[byte_index + 4*i  ] = <unsigned char>((uint32s[i] >> 24)      )
-            _bytes[byte_index + 4*i+1] = <unsigned char>((uint32s[i] >> 16) & 255)
-            _bytes[byte_index + 4*i+2] = <unsigned char>((uint32s[i] >>  8) & 255)
-            _bytes[byte_index + 4*i+3] = <unsigned char>((uint32s[i]      ) & 255)
-    else:
-        for i in range(num_uint32s):
-            for s in range(4):
-                base = uint32s[i] >> (8 * (3 - s))                    
-                byte = (<unsigned char>base) >> bit_index
-                _bytes[byte_index + 4*i+s] = \
-                  (_bytes[byte_index + 4*i+s] & mask1) | byte
-                byte = ((<unsigned char>base) << bit_index) & 255
-                _bytes[byte_index + 4*i+s+1] = \
-                  (_bytes[byte_index + 4*i+s+1] & mask2) | byte
-    stream._write_offset += 32 * num_uint32s
+    _write_array(stream, uint32s, 4)
 
 register(uint32, reader=read_uint32, writer=write_uint32)
 
@@ -1310,7 +2457,9 @@ cpdef read_int32(BitStream stream, n=None):
     """
     Read signed 32-bit integers from a stream.
     """
-    return read_uint32(stream, n).astype("int32")
+    if n is None:
+        return read_uint32(stream).astype(int32)
+    return read_uint32(stream, n).view(int32)
 
 cpdef write_int32(BitStream stream, data):
     """
@@ -1323,114 +2472,20 @@ cpdef _write_int32(BitStream stream, np.ndarray[np.int32_t, ndim=1] int32s):
     """
     Write a 1-dim. arrray of signed 32-bit integers into a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t i, num_int32s, byte_index
-    cdef unsigned long bit_length, bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, base, byte
-                            
-    num_int32s = len(int32s)
-    stream._extend(32 * num_int32s)
-    _bytes = stream._bytes
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-    
-    if bit_index == 0:
-        for i in range(num_int32s):
-            _bytes[byte_index + 2*i  ] = <unsigned char>((int32s[i] >> 24)      )
-            _bytes[byte_index + 2*i+1] = <unsigned char>((int32s[i] >> 16) & 255)
-            _bytes[byte_index + 2*i+2] = <unsigned char>((int32s[i] >>  8) & 255)
-            _bytes[byte_index + 2*i+3] = <unsigned char>((int32s[i]      ) & 255)
-    else:
-        for i in range(num_int32s):
-            for s in range(4):
-                base = int32s[i] >> (8 * (3 - s))                    
-                byte = (<unsigned char>base) >> bit_index
-                _bytes[byte_index + 4*i+s] = \
-                  (_bytes[byte_index + 4*i+s] & mask1) | byte
-                byte = ((<unsigned char>base) << bit_index) & 255
-                _bytes[byte_index + 4*i+s+1] = \
-                  (_bytes[byte_index + 4*i+s+1] & mask2) | byte
-    stream._write_offset += 32 * num_int32s
+    _write_array(stream, int32s, 4)
 
 register(int32, reader=read_int32, writer=write_int32)
 
 cpdef read_uint64(BitStream stream, n=None):
     """
-    Read unsigned 32-bit integers from a stream.
+    Read unsigned 64-bit integers from a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t byte_index
-    cdef unsigned long bit_length, 
-    cdef unsigned char bit_index, bit_index_c
-    cdef unsigned char mask1, mask2
-    cdef unsigned long long uint64
-    cdef size_t i
-    cdef unsigned char s
-    cdef size_t num_uint64s
-
-    _bytes = stream._bytes
-    byte_index = stream._read_offset // 8
-    bit_index  = stream._read_offset - 8 * byte_index
-    
     if n is None:
         if len(stream) < 64:
             raise ReadError("end of stream")
         stream._read_offset += 64
-        if bit_index == 0:
-            uint64 = (<unsigned long long>(_bytes[byte_index    ]) << 56) + \
-                     (<unsigned long long>(_bytes[byte_index + 1]) << 48) + \
-                     (<unsigned long long>(_bytes[byte_index + 2]) << 40) + \
-                     (<unsigned long long>(_bytes[byte_index + 3]) << 32) + \
-                     (<unsigned long long>(_bytes[byte_index + 4]) << 24) + \
-                     (<unsigned long long>(_bytes[byte_index + 5]) << 16) + \
-                     (<unsigned long long>(_bytes[byte_index + 6]) <<  8) + \
-                     (<unsigned long long>(_bytes[byte_index + 7])      )
-            return numpy.uint64(uint64)
-        else:
-            bit_index_c = 8 - bit_index
-            mask1 = 255 >> bit_index
-            mask2 = 255 - mask1
-            uint64 = 0
-            for s in range(8):
-                uint64 = uint64 << 8
-                uint64 += ((_bytes[byte_index + s    ] & mask1) << bit_index) + \
-                          ((_bytes[byte_index + s + 1] & mask2) >> bit_index_c)
-            return numpy.uint64(uint64)
-
-    if len(stream) < 64 * n:
-        raise ReadError("end of stream")
-
-    num_uint64s = min(n, len(stream) / 64)
-    uint64s = numpy.zeros(num_uint64s, dtype=numpy.uint64)
-    if bit_index == 0:
-        for i in range(num_uint64s):
-            uint64 = (_bytes[byte_index + 8*i  ] << 56) + \
-                     (_bytes[byte_index + 8*i+1] << 48) + \
-                     (_bytes[byte_index + 8*i+2] << 40) + \
-                     (_bytes[byte_index + 8*i+3] << 32) + \
-                     (_bytes[byte_index + 8*i+4] << 24) + \
-                     (_bytes[byte_index + 8*i+5] << 16) + \
-                     (_bytes[byte_index + 8*i+6] <<  8) + \
-                     (_bytes[byte_index + 8*i+7]      )
-            uint64s[i] = uint64
-    else:
-        bit_index_c = 8 - bit_index
-        mask1 = 255 >> bit_index
-        mask2 = 255 - mask1
-        for i in range(num_uint64s):
-            uint64 = 0
-            for s in range(8):
-                uint64 = uint64 << 8
-                uint64 = ((_bytes[byte_index + 8*i+s  ] & mask1) << bit_index  ) + \
-                         ((_bytes[byte_index + 8*i+s+1] & mask2) >> bit_index_c)
-            uint64s[i] = uint64
-    stream._read_offset += 64 * num_uint64s
-    return uint64s
+        return uint64(_get_bits(stream._bytes, stream._read_offset - 64, 64))
+    return _read_array(stream, n, uint64, 8)
 
 cpdef write_uint64(BitStream stream, data):
     """
@@ -1443,43 +2498,7 @@ cpdef _write_uint64(BitStream stream, np.ndarray[np.uint64_t, ndim=1] uint64s):
     """
     Write a 1-dim. arrray of unsigned 64-bit integers into a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t i, num_uint64s, byte_index
-    cdef unsigned long bit_length, bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, base, byte
-                            
-    num_uint64s = len(uint64s)
-    stream._extend(64 * num_uint64s)
-    _bytes = stream._bytes
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-    
-    if bit_index == 0:
-        for i in range(num_uint64s):
-            _bytes[byte_index + 8*i  ] = <unsigned char>((uint64s[i] >> 56) & 255)
-            _bytes[byte_index + 8*i+1] = <unsigned char>((uint64s[i] >> 48) & 255)
-            _bytes[byte_index + 8*i+2] = <unsigned char>((uint64s[i] >> 40) & 255)
-            _bytes[byte_index + 8*i+3] = <unsigned char>((uint64s[i] >> 32) & 255)
-            _bytes[byte_index + 8*i+4] = <unsigned char>((uint64s[i] >> 24) & 255)
-            _bytes[byte_index + 8*i+5] = <unsigned char>((uint64s[i] >> 16) & 255)
-            _bytes[byte_index + 8*i+6] = <unsigned char>((uint64s[i] >>  8) & 255)
-            _bytes[byte_index + 8*i+7] = <unsigned char>((uint64s[i]      ) & 255)
-    else:
-        for i in range(num_uint64s):
-            for s in range(8):
-                base = (uint64s[i] >> (8 * (7 - s))) & 255                   
-                byte = (<unsigned char>base) >> bit_index
-                _bytes[byte_index + 8*i+s] = \
-                  (_bytes[byte_index + 8*i+s] & mask1) | byte
-                byte = ((<unsigned char>base) << bit_index) & 255
-                _bytes[byte_index + 8*i+s+1] = \
-                  (_bytes[byte_index + 8*i+s+1] & mask2) | byte
-    stream._write_offset += 64 * num_uint64s
+    _write_array(stream, uint64s, 8)
 
 register(uint64, reader=read_uint64, writer=write_uint64)
 
@@ -1487,7 +2506,9 @@ cpdef read_int64(BitStream stream, n=None):
     """
     Read signed 64-bit integers from a stream.
     """
-    return read_uint64(stream, n).astype("int64")
+    if n is None:
+        return read_uint64(stream).astype(int64)
+    return read_uint64(stream, n).view(int64)
 
 cpdef write_int64(BitStream stream, data):
     """
@@ -1498,123 +2519,565 @@ cpdef write_int64(BitStream stream, data):
 
 cpdef _write_int64(BitStream stream, np.ndarray[np.int64_t, ndim=1] int64s):
     """
-    Write a 1-dim. arrray of unsigned 64-bit integers into a stream.
+    Write a 1-dim. arrray of signed 64-bit integers into a stream.
     """
-    cdef unsigned char* _bytes
-    cdef size_t i, num_int64s, byte_index
-    cdef unsigned long bit_length, bit_index, bit_index_c
-    cdef unsigned char mask1, mask2, base, byte
-                            
-    num_int64s = len(int64s)
-    stream._extend(64 * num_int64s)
-    _bytes = stream._bytes
-
-    byte_index = stream._write_offset // 8
-    bit_index  = stream._write_offset - 8 * byte_index
-    bit_index_c = 8 - bit_index
-
-    mask2 = 255 >> bit_index
-    mask1 = 255 - mask2
-    
-    if bit_index == 0:
-        for i in range(num_int64s):
-            _bytes[byte_index + 8*i  ] = <unsigned char>((int64s[i] >> 56) & 255)
-            _bytes[byte_index + 8*i+1] = <unsigned char>((int64s[i] >> 48) & 255)
-            _bytes[byte_index + 8*i+2] = <unsigned char>((int64s[i] >> 40) & 255)
-            _bytes[byte_index + 8*i+3] = <unsigned char>((int64s[i] >> 32) & 255)
-            _bytes[byte_index + 8*i+4] = <unsigned char>((int64s[i] >> 24) & 255)
-            _bytes[byte_index + 8*i+5] = <unsigned char>((int64s[i] >> 16) & 255)
-            _bytes[byte_index + 8*i+6] = <unsigned char>((int64s[i] >>  8) & 255)
-            _bytes[byte_index + 8*i+7] = <unsigned char>((int64s[i]      ) & 255)
-    else:
-        for i in range(num_int64s):
-            for s in range(8):
-                base = (int64s[i] >> (8 * (7 - s))) & 255                   
-                byte = (<unsigned char>base) >> bit_index
-                _bytes[byte_index + 8*i+s] = \
-                  (_bytes[byte_index + 8*i+s] & mask1) | byte
-                byte = ((<unsigned char>base) << bit_index) & 255
-                _bytes[byte_index + 8*i+s+1] = \
-                  (_bytes[byte_index + 8*i+s+1] & mask2) | byte
-    stream._write_offset += 64 * num_int64s
+    _write_array(stream, int64s, 8)
 
 register(int64, reader=read_int64, writer=write_int64)
 
-# Floating-Point Data Reader and Writer: 64 bits (double)
+# Arbitrary Bit-Width Integers: uint(k) and sint(k), 1 <= k <= 64
 # ------------------------------------------------------------------------------
-cpdef read_float64(BitStream stream, n=None):
+ctypedef fused _integer:
+    np.uint8_t
+    np.uint16_t
+    np.uint32_t
+    np.uint64_t
+    np.int8_t
+    np.int16_t
+    np.int32_t
+    np.int64_t
+
+@cython.profile(False)
+cdef inline uint64_t _reverse_bits(uint64_t value, unsigned int num_bits) noexcept nogil:
     """
-    Read 64-bit floating-point numbers (doubles) from a stream.
+    Reverse the order of the `num_bits` lowest bits of `value`.
+    """
+    value = ((value >> 1) & 0x5555555555555555ULL) | ((value & 0x5555555555555555ULL) << 1)
+    value = ((value >> 2) & 0x3333333333333333ULL) | ((value & 0x3333333333333333ULL) << 2)
+    value = ((value >> 4) & 0x0F0F0F0F0F0F0F0FULL) | ((value & 0x0F0F0F0F0F0F0F0FULL) << 4)
+    return bswap64(value) >> (64 - num_bits)
+
+@cython.profile(False)
+cdef void _get_fields(_integer *dst, 
+                      const unsigned char *src, unsigned long long offset,
+                      size_t n, unsigned int num_bits, bint signed, 
+                      bint lsb_first) noexcept nogil:
     """
-    cdef size_t n_
+    Decode `n` integers of `num_bits` bits found at `offset` in `src`.
 
-    if n is None:
-        n_ = 1
-    else:
-        n_ = n
+    Signed integers use the two's complement representation.
+    """
+    cdef size_t i
+    cdef uint64_t value, sign = (<uint64_t>1) << (num_bits - 1)
+
+    for i in range(n):
+        value = _get_bits(src, offset, num_bits)
+        if lsb_first:
+            value = _reverse_bits(value, num_bits)
+        if signed:
+            value = (value ^ sign) - sign
+        dst[i] = <_integer>value
+        offset = offset + num_bits
+
+@cython.profile(False)
+cdef void _put_fields(unsigned char *dst, unsigned long long offset,
+                      const uint64_t *src, size_t n, 
+                      unsigned int num_bits, bint lsb_first) noexcept nogil:
+    """
+    Encode the `num_bits` lowest bits of `n` integers into `dst` at `offset`.
 
-    chars = read_bytes(stream, 8*n_)
-    float64s = struct.unpack(">" + n_*"d", chars) # big-endian
+    The bits are accumulated in a 64-bit word which is stored at once.
+    """
+    cdef unsigned char *pointer = dst + (offset >> 3)
+    cdef unsigned int count = offset & 7 # number of bits in the accumulator
+    cdef unsigned int extra
+    cdef uint64_t mask = (<uint64_t>-1) >> (64 - num_bits)
+    cdef uint64_t accumulator, value
+    cdef size_t i
 
-    if n is None:
-        return float64s[0]
+    accumulator = (pointer[0] >> (8 - count)) if count else 0
+    for i in range(n):
+        if lsb_first:
+            value = _reverse_bits(src[i], num_bits)
+        else:
+            value = src[i] & mask
+        if count == 0:
+            accumulator = value
+            count = num_bits
+        elif count + num_bits <= 64:
+            accumulator = (accumulator << num_bits) | value
+            count = count + num_bits
+        else:
+            extra = count + num_bits - 64
+            store_be64(pointer, (accumulator << (64 - count)) | (value >> extra))
+            pointer = pointer + 8
+            accumulator = value & ((<uint64_t>1 << extra) - 1)
+            count = extra
+        if count == 64:
+            store_be64(pointer, accumulator)
+            pointer = pointer + 8
+            count = 0
+    if count:
+        _put_bits(pointer, 0, count, accumulator)
+
+# Sequential writes of variable-size bit fields.
+ctypedef struct _BitWriter:
+    unsigned char *pointer
+    unsigned int count # number of bits in the accumulator
+    uint64_t accumulator
+
+@cython.profile(False)
+cdef inline void _writer_init(_BitWriter *writer, unsigned char *dst, 
+                              unsigned long long offset) noexcept nogil:
+    writer.pointer = dst + (offset >> 3)
+    writer.count = offset & 7
+    writer.accumulator = (writer.pointer[0] >> (8 - writer.count)) \
+                         if writer.count else 0
+
+@cython.profile(False)
+cdef inline void _writer_put(_BitWriter *writer, 
+                             uint64_t value, unsigned int num_bits) noexcept nogil:
+    """
+    Write the `num_bits` bits (1 to 64) of `value` (a smaller integer).
+    """
+    cdef unsigned int count = writer.count
+    cdef unsigned int extra
+    if count == 0:
+        writer.accumulator = value
+        count = num_bits
+    elif count + num_bits <= 64:
+        writer.accumulator = (writer.accumulator << num_bits) | value
+        count = count + num_bits
     else:
-        return numpy.array(float64s, dtype=numpy.float64)
-
-cpdef write_float64(BitStream stream, data):
+        extra = count + num_bits - 64
+        store_be64(writer.pointer, 
+                   (writer.accumulator << (64 - count)) | (value >> extra))
+        writer.pointer = writer.pointer + 8
+        writer.accumulator = value & ((<uint64_t>1 << extra) - 1)
+        count = extra
+    if count == 64:
+        store_be64(writer.pointer, writer.accumulator)
+        writer.pointer = writer.pointer + 8
+        count = 0
+    writer.count = count
+
+@cython.profile(False)
+cdef inline void _writer_put_zeros(_BitWriter *writer, 
+                                   unsigned long long num_bits) noexcept nogil:
+    while num_bits >= 64:
+        _writer_put(writer, 0, 64)
+        num_bits -= 64
+    if num_bits:
+        _writer_put(writer, 0, num_bits)
+
+@cython.profile(False)
+cdef inline void _writer_flush(_BitWriter *writer) noexcept nogil:
+    if writer.count:
+        _put_bits(writer.pointer, 0, writer.count, writer.accumulator)
+        writer.count = 0
+
+@cython.profile(False)
+cdef inline uint64_t _peek_word(const unsigned char *src, 
+                                unsigned long long offset, 
+                                unsigned long long end) noexcept nogil:
     """
-    Write 64-bit floating-point numbers (doubles) into a stream.
+    Return the 64 bits found at `offset`, padded with zeros after `end`.
     """
-    array = numpy.array(data, dtype=float64, copy=False, ndmin=1)
-    _write_float64(stream, array)
+    if end - offset >= 64:
+        return _get_bits(src, offset, 64)
+    elif end > offset:
+        return _get_bits(src, offset, end - offset) << (64 - (end - offset))
+    else:
+        return 0
 
-cpdef _write_float64(BitStream stream, np.ndarray[np.float64_t, ndim=1] float64s):
+@cython.profile(False)
+cdef inline unsigned long long _count_run(const unsigned char *src,
+                                          unsigned long long offset, 
+                                          unsigned long long end,
+                                          bint value) noexcept nogil:
     """
-    Write a 1-dim. array of 64-bit floating-point numbers into a stream.
+    Return the number of consecutive bits equal to `value` found at `offset`
+    (and before `end`).
     """
-    cdef size_t num_floats
-
-    cdef size_t byte_offset
-    cdef unsigned char bit_offset, bit_offset_c
-    cdef unsigned char* pointer
-
-    cdef size_t i
-    cdef unsigned char j
-    cdef unsigned char *_buffer = [0, 0, 0, 0, 0, 0, 0, 0]
-    cdef double _float
-
-    num_floats = len(float64s)
-    stream._extend(64 * num_floats)
-
-    bit_offset  = stream._write_offset % 8
-    byte_offset = stream._write_offset // 8
-    pointer = stream._bytes + byte_offset
-    if bit_offset == 0:
-        for _float in float64s:
-            PyFloat_Pack8(_float, pointer, 0) # 0 is for big endian.
-            pointer += 8
+    cdef unsigned long long start = offset, count
+    cdef uint64_t word
+    while offset < end:
+        word = _peek_word(src, offset, end)
+        if value:
+            word = ~word
+        if word:
+            count = offset - start + clz64(word)
+            return count if count < end - start else end - start
+        offset += 64
+    return end - start
+
+@cython.profile(False)
+cdef void _get_integers(void *dst, 
+                        const unsigned char *src, unsigned long long offset,
+                        size_t n, unsigned int num_bits, bint signed, 
+                        bint lsb_first) noexcept nogil:
+    """
+    Decode `n` integers of `num_bits` bits found at `offset` in `src`
+    into an array of the smallest integer type that holds them.
+    """
+    if num_bits <= 8:
+        if signed:
+            _get_fields(<np.int8_t *>dst, src, offset, n, num_bits, True, lsb_first)
+        else:
+            _get_fields(<np.uint8_t *>dst, src, offset, n, num_bits, False, lsb_first)
+    elif num_bits <= 16:
+        if signed:
+            _get_fields(<np.int16_t *>dst, src, offset, n, num_bits, True, lsb_first)
+        else:
+            _get_fields(<np.uint16_t *>dst, src, offset, n, num_bits, False, lsb_first)
+    elif num_bits <= 32:
+        if signed:
+            _get_fields(<np.int32_t *>dst, src, offset, n, num_bits, True, lsb_first)
+        else:
+            _get_fields(<np.uint32_t *>dst, src, offset, n, num_bits, False, lsb_first)
     else:
-        bit_offset_c = 8 - bit_offset
-        for _float in float64s:
-            PyFloat_Pack8(_float, _buffer, 0)
-            for i in range(8):
-                pointer[i  ] =  (pointer[i  ] & (255 << bit_offset_c)) + \
-                               ((_buffer[i  ] & (255 << bit_offset  )) >> bit_offset  )
-                pointer[i+1] = ((_buffer[i  ] & (255 >> bit_offset_c)) << bit_offset_c) + \
-                                (pointer[i+1] & (255 >> bit_offset))
-            pointer = pointer + 8
-    stream._write_offset += 64 * num_floats
+        if signed:
+            _get_fields(<np.int64_t *>dst, src, offset, n, num_bits, True, lsb_first)
+        else:
+            _get_fields(<np.uint64_t *>dst, src, offset, n, num_bits, False, lsb_first)
 
-register(numpy.float64, reader=read_float64, writer=write_float64)
-register(float, reader=read_float64, writer=write_float64)
+cdef class uint:
+    """
+    Type identifier of unsigned integers of `num_bits` bits (1 to 64).
 
+    The most significant bit comes first, unless `lsb_first` is true.
 
-# String Reader / Writer
-# ------------------------------------------------------------------------------
-cpdef read_bytes(BitStream stream, n=None):
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream(5, uint(3))
+        101
+        >>> BitStream(6, uint(3, lsb_first=True))
+        011
     """
-    Read a string from a stream.
+    def __init__(self, num_bits, lsb_first=False):
+        if not 1 <= num_bits <= 64:
+            raise ValueError("the number of bits should be in 1-64.")
+        self.num_bits = num_bits
+        self.lsb_first = lsb_first
+
+    def __repr__(self):
+        if self.lsb_first:
+            return "uint({0}, lsb_first=True)".format(self.num_bits)
+        return "uint({0})".format(self.num_bits)
+
+cdef class sint:
     """
+    Type identifier of signed integers of `num_bits` bits (1 to 64).
+
+    Signed integers use the two's complement representation.
+    The most significant bit comes first, unless `lsb_first` is true.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream(-3, sint(3))
+        101
+    """
+    def __init__(self, num_bits, lsb_first=False):
+        if not 1 <= num_bits <= 64:
+            raise ValueError("the number of bits should be in 1-64.")
+        self.num_bits = num_bits
+        self.lsb_first = lsb_first
+
+    def __repr__(self):
+        if self.lsb_first:
+            return "sint({0}, lsb_first=True)".format(self.num_bits)
+        return "sint({0})".format(self.num_bits)
+
+cdef type _integer_dtype(unsigned int num_bits, bint signed):
+    """
+    Return the smallest NumPy integer type that holds `num_bits` bits.
+    """
+    if num_bits <= 8:
+        return int8 if signed else uint8
+    elif num_bits <= 16:
+        return int16 if signed else uint16
+    elif num_bits <= 32:
+        return int32 if signed else uint32
+    else:
+        return int64 if signed else uint64
+
+cdef object _read_fields(BitStream stream, unsigned int num_bits, n, 
+                         bint signed, bint lsb_first):
+    cdef size_t num_items
+    cdef np.ndarray array
+    cdef type dtype
+    cdef void *data
+    cdef unsigned char *_bytes = stream._bytes
+    cdef unsigned long long offset = stream._read_offset
+
+    dtype = _integer_dtype(num_bits, signed)
+    if n is None:
+        return _read_fields(stream, num_bits, 1, signed, lsb_first)[0]
+    if len(stream) < num_bits * n:
+        raise ReadError("end of stream")
+    num_items = n
+    array = numpy.empty(num_items, dtype=dtype)
+    data = np.PyArray_DATA(array)
+    if num_bits * num_items < 8 * nogil_threshold:
+        _get_integers(data, _bytes, offset, 
+                      num_items, num_bits, signed, lsb_first)
+    else:
+        with nogil:
+            _get_integers(data, _bytes, offset, 
+                          num_items, num_bits, signed, lsb_first)
+    stream._read_offset += num_bits * num_items
+    return array
+
+cdef int _write_fields(BitStream stream, unsigned int num_bits, data, 
+                       bint lsb_first) except -1:
+    cdef size_t num_items
+    cdef np.ndarray array
+    cdef uint64_t *values
+
+    if isinstance(data, np.ndarray):
+        array = data
+    else:
+        try:
+            array = numpy.array(data, dtype=int64, ndmin=1)
+        except OverflowError: # Python integers larger than 2**63 - 1
+            array = numpy.array(data, dtype=uint64, ndmin=1)
+    if array.dtype.kind == "u":
+        array = numpy.ascontiguousarray(array, dtype=uint64)
+    else:
+        array = numpy.ascontiguousarray(array, dtype=int64).view(uint64)
+    if array.ndim != 1:
+        raise ValueError("data should be a scalar or a 1-dim. sequence.")
+    num_items = array.shape[0]
+    stream._extend(num_bits * num_items)
+    values = <uint64_t *>np.PyArray_DATA(array)
+    if num_bits * num_items < 8 * nogil_threshold:
+        _put_fields(stream._bytes, stream._write_offset, 
+                    values, num_items, num_bits, lsb_first)
+    else:
+        with nogil:
+            _put_fields(stream._bytes, stream._write_offset, 
+                        values, num_items, num_bits, lsb_first)
+    stream._write_offset += num_bits * num_items
+    return 0
+
+cpdef read_uint(BitStream stream, unsigned int num_bits, n=None, 
+                bint lsb_first=False):
+    """
+    Read unsigned integers of `num_bits` bits from a stream.
+
+    The result is a scalar or an array of the smallest NumPy unsigned
+    integer type that can hold `num_bits` bits.
+    """
+    return _read_fields(stream, num_bits, n, False, lsb_first)
+
+cpdef write_uint(BitStream stream, unsigned int num_bits, data, 
+                 bint lsb_first=False):
+    """
+    Write unsigned integers of `num_bits` bits into a stream.
+
+    The integers are reduced modulo `2**num_bits`.
+    """
+    _write_fields(stream, num_bits, data, lsb_first)
+
+cpdef read_sint(BitStream stream, unsigned int num_bits, n=None, 
+                bint lsb_first=False):
+    """
+    Read signed integers of `num_bits` bits from a stream.
+
+    The result is a scalar or an array of the smallest NumPy signed
+    integer type that can hold `num_bits` bits.
+    """
+    return _read_fields(stream, num_bits, n, True, lsb_first)
+
+cpdef write_sint(BitStream stream, unsigned int num_bits, data, 
+                 bint lsb_first=False):
+    """
+    Write signed integers of `num_bits` bits into a stream.
+
+    The integers are reduced modulo `2**num_bits`.
+    """
+    _write_fields(stream, num_bits, data, lsb_first)
+
+def _uint_reader(uint instance):
+    cdef unsigned int num_bits = instance.num_bits
+    cdef bint lsb_first = instance.lsb_first
+    def reader(BitStream stream, n=None):
+        return read_uint(stream, num_bits, n, lsb_first)
+    return reader
+
+def _uint_writer(uint instance):
+    cdef unsigned int num_bits = instance.num_bits
+    cdef bint lsb_first = instance.lsb_first
+    def writer(BitStream stream, data):
+        write_uint(stream, num_bits, data, lsb_first)
+    return writer
+
+def _sint_reader(sint instance):
+    cdef unsigned int num_bits = instance.num_bits
+    cdef bint lsb_first = instance.lsb_first
+    def reader(BitStream stream, n=None):
+        return read_sint(stream, num_bits, n, lsb_first)
+    return reader
+
+def _sint_writer(sint instance):
+    cdef unsigned int num_bits = instance.num_bits
+    cdef bint lsb_first = instance.lsb_first
+    def writer(BitStream stream, data):
+        write_sint(stream, num_bits, data, lsb_first)
+    return writer
+
+register(uint, reader=_uint_reader, writer=_uint_writer)
+register(sint, reader=_sint_reader, writer=_sint_writer)
+
+
+# Little-Endian Numeric Types
+# ------------------------------------------------------------------------------
+cdef class little_endian:
+    """
+    Type identifier of the little-endian variant of a NumPy numeric type.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream(1, little_endian(uint16))
+        0000000100000000
+    """
+    def __init__(self, type):
+        if type not in _little_endian_types:
+            raise TypeError("unsupported type {0!r}.".format(type))
+        self.type = type
+        self.width = numpy.dtype(type).itemsize
+
+    def __repr__(self):
+        return "little_endian({0})".format(self.type.__name__)
+
+cdef tuple _little_endian_types = (
+  uint16, int16, uint32, int32, uint64, int64, float16, float32, float64
+)
+
+cpdef read_little_endian(BitStream stream, little_endian type, n=None):
+    """
+    Read little-endian numbers from a stream.
+
+    Scalars have the same type as their big-endian counterparts.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> stream = BitStream([1, 2], float64le)
+        >>> read_little_endian(stream, float64le)
+        1.0
+        >>> type(read_little_endian(stream, float64le))
+        <class 'float'>
+    """
+    if n is None:
+        value = _read_array(stream, 1, type.type, type.width, True)[0]
+        return float(value) if type.type is float64 else value
+    return _read_array(stream, n, type.type, type.width, True)
+
+cpdef write_little_endian(BitStream stream, little_endian type, data):
+    """
+    Write numbers as little-endian data into a stream.
+    """
+    array = numpy.array(data, dtype=type.type, copy=False, ndmin=1)
+    if array.ndim != 1:
+        raise ValueError("data should be a scalar or a 1-dim. sequence.")
+    _write_array(stream, array, type.width, True)
+
+def _little_endian_reader(little_endian instance):
+    def reader(BitStream stream, n=None):
+        return read_little_endian(stream, instance, n)
+    return reader
+
+def _little_endian_writer(little_endian instance):
+    def writer(BitStream stream, data):
+        write_little_endian(stream, instance, data)
+    return writer
+
+register(little_endian, 
+         reader=_little_endian_reader, writer=_little_endian_writer)
+
+uint16le  = little_endian(uint16)
+int16le   = little_endian(int16)
+uint32le  = little_endian(uint32)
+int32le   = little_endian(int32)
+uint64le  = little_endian(uint64)
+int64le   = little_endian(int64)
+float16le = little_endian(float16)
+float32le = little_endian(float32)
+float64le = little_endian(float64)
+
+
+# Floating-Point Data Readers and Writers: 16, 32 and 64 bits
+# ------------------------------------------------------------------------------
+cpdef read_float64(BitStream stream, n=None):
+    """
+    Read 64-bit floating-point numbers (doubles) from a stream.
+    """
+    if n is None:
+        return float(_read_array(stream, 1, float64, 8)[0])
+    return _read_array(stream, n, float64, 8)
+
+cpdef write_float64(BitStream stream, data):
+    """
+    Write 64-bit floating-point numbers (doubles) into a stream.
+    """
+    array = numpy.array(data, dtype=float64, copy=False, ndmin=1)
+    _write_float64(stream, array)
+
+cpdef _write_float64(BitStream stream, np.ndarray[np.float64_t, ndim=1] float64s):
+    """
+    Write a 1-dim. array of 64-bit floating-point numbers into a stream.
+    """
+    _write_array(stream, float64s, 8)
+
+register(numpy.float64, reader=read_float64, writer=write_float64)
+register(float, reader=read_float64, writer=write_float64)
+
+cpdef read_float32(BitStream stream, n=None):
+    """
+    Read 32-bit floating-point numbers (singles) from a stream.
+    """
+    if n is None:
+        return _read_array(stream, 1, float32, 4)[0]
+    return _read_array(stream, n, float32, 4)
+
+cpdef write_float32(BitStream stream, data):
+    """
+    Write 32-bit floating-point numbers (singles) into a stream.
+    """
+    array = numpy.array(data, dtype=float32, copy=False, ndmin=1)
+    _write_float32(stream, array)
+
+cpdef _write_float32(BitStream stream, np.ndarray[np.float32_t, ndim=1] float32s):
+    """
+    Write a 1-dim. array of 32-bit floating-point numbers into a stream.
+    """
+    _write_array(stream, float32s, 4)
+
+register(numpy.float32, reader=read_float32, writer=write_float32)
+
+cpdef read_float16(BitStream stream, n=None):
+    """
+    Read 16-bit floating-point numbers (halves) from a stream.
+    """
+    if n is None:
+        return _read_array(stream, 1, float16, 2)[0]
+    return _read_array(stream, n, float16, 2)
+
+cpdef write_float16(BitStream stream, data):
+    """
+    Write 16-bit floating-point numbers (halves) into a stream.
+    """
+    array = numpy.array(data, dtype=float16, copy=False, ndmin=1)
+    if array.ndim != 1:
+        raise ValueError("data should be a scalar or a 1-dim. sequence.")
+    _write_array(stream, array, 2)
+
+register(numpy.float16, reader=read_float16, writer=write_float16)
+
+
+# String Reader / Writer
+# ------------------------------------------------------------------------------
+cpdef read_bytes(BitStream stream, n=None):
+    """
+    Read a string from a stream.
+    """
+    cdef unsigned long long num_bytes
+    cdef unsigned char *data
+
     if n is None:
         if (len(stream) % 8) != 0:
             raise ReadError("cannot empty the stream.")
@@ -1622,7 +3085,16 @@ cpdef read_bytes(BitStream stream, n=None):
             n = len(stream) // 8
     elif n > len(stream) // 8:
         raise ReadError("end of stream")
-    return read_uint8(stream, n).tobytes()
+    num_bytes = n
+    string = PyBytes_FromStringAndSize(NULL, num_bytes)
+    data = <unsigned char *>PyBytes_AS_STRING(string)
+    if num_bytes < nogil_threshold:
+        _copy_bits(data, 0, stream._bytes, stream._read_offset, 8 * num_bytes)
+    else:
+        with nogil:
+            _copy_bits(data, 0, stream._bytes, stream._read_offset, 8 * num_bytes)
+    stream._read_offset += 8 * num_bytes
+    return string
 
 cpdef write_bytes(BitStream stream, string):
     """
@@ -1633,22 +3105,41 @@ cpdef write_bytes(BitStream stream, string):
 
 register(bytes, reader=read_bytes, writer=write_bytes)
 
+def _unpickle(data, offset_bits, length_bits):
+    return BitStream.from_buffer(data, offset_bits, length_bits)
+
 
 # BitStream Reader/Writer
 # ------------------------------------------------------------------------------
+cdef BitStream _concatenate(list streams):
+    """
+    Concatenate the contents of `streams` into a new stream.
+    """
+    cdef BitStream sink = BitStream()
+    cdef BitStream stream
+    cdef unsigned long long num_bits = 0
+
+    for stream in streams:
+        num_bits += stream._write_offset - stream._read_offset
+    sink._extend(num_bits) # a single allocation
+    for stream in streams:
+        sink.extend(stream)
+    return sink
+
 cpdef write_bitstream(BitStream sink, BitStream source):
     """
-    Write the stream `source` into the stream `sink`.
+    Write the stream `source` into the stream `sink` (and consume `source`).
     """
-    write_uint8(sink, read_uint8(source, len(source) // 8))
-    write_bool(sink, read_bool(source, len(source)))
+    cdef unsigned long long num_bits = len(source)
+    sink.extend(source)
+    source._read_offset += num_bits
 
 cpdef read_bitstream(BitStream source, n=None):
     """
     Read a stream from a stream.
     """
     cdef BitStream sink
-    cdef size_t start_byte_index_start, end_byte_index, num_bits, new_num_bytes
+    cdef size_t start_byte_index, end_byte_index, num_bits, new_num_bytes
     if n is None:
         num_bits = len(source) # read the whole stream
     elif n > len(source):
@@ -1664,14 +3155,1737 @@ cpdef read_bitstream(BitStream source, n=None):
         end_byte_index   = (source._read_offset + num_bits - 1) // 8
         new_num_bytes = end_byte_index - start_byte_index + 1
 
-    sink = BitStream()
-    sink._extend(8 * new_num_bytes)
-    memcpy(sink._bytes, &source._bytes[start_byte_index], new_num_bytes)
+    if new_num_bytes >= view_threshold and \
+       not isinstance(source, MappedBitStream):
+        # copy-on-write view: borrow the memory of the source.
+        source._share()
+        source._view_end = max(source._view_end, source._read_offset + num_bits)
+        sink = BitStream.__new__(BitStream)
+        PyObject_GetBuffer(source._buffer.obj, &sink._buffer, PyBUF_SIMPLE)
+        sink._borrowed = True
+        sink._bytes = source._bytes + start_byte_index
+        sink._num_bytes = sink._capacity = new_num_bytes
+    else:
+        sink = BitStream()
+        sink._extend(8 * new_num_bytes)
+        if new_num_bytes < nogil_threshold:
+            memcpy(sink._bytes, &source._bytes[start_byte_index], new_num_bytes)
+        else:
+            with nogil:
+                memcpy(sink._bytes, &source._bytes[start_byte_index], new_num_bytes)
 
     sink._read_offset  = source._read_offset  - 8 * start_byte_index
     sink._write_offset = sink._read_offset + num_bits
+    sink._base_offset = -sink._read_offset
     source._read_offset += num_bits
     return sink
 
 register(BitStream, reader=read_bitstream, writer=write_bitstream)
 
+
+# Prefix Codes
+# ------------------------------------------------------------------------------
+# The decoder reads windows of `_window_bits` bits and looks them up in a 
+# table that lists the (up to `_window_symbols`) symbols whose codes fit 
+# entirely in the window. Longer codes and the end of the stream are decoded
+# bit by bit with a binary tree.
+cdef enum:
+    _window_bits = 12
+    _window_symbols = 4
+
+@cython.profile(False)
+cdef void _put_codes(unsigned char *dst, unsigned long long offset,
+                     const np.int64_t *indices, size_t n,
+                     const uint64_t *codes, const np.uint8_t *lengths) noexcept nogil:
+    """
+    Encode the codes of `n` symbol `indices` into `dst` at `offset`.
+    """
+    cdef _BitWriter writer
+    cdef size_t i
+    _writer_init(&writer, dst, offset)
+    for i in range(n):
+        _writer_put(&writer, codes[indices[i]], lengths[indices[i]])
+    _writer_flush(&writer)
+
+@cython.profile(False)
+cdef size_t _get_codes(np.uint32_t *dst, size_t n,
+                       const unsigned char *src, unsigned long long *offset, 
+                       unsigned long long end, const np.int32_t *tree, 
+                       const np.uint8_t *counts, const np.uint32_t *symbols,
+                       const np.uint8_t *ends) noexcept nogil:
+    """
+    Decode up to `n` symbol indices from `src` at `offset[0]` (and before `end`).
+
+    Return the number of decoded symbols; less than `n` symbols are decoded 
+    if the data is invalid or truncated. On success, `offset[0]` is updated.
+    """
+    cdef unsigned long long position = offset[0]
+    cdef size_t i = 0, j, count
+    cdef uint64_t window
+    cdef np.int32_t node
+
+    while i < n:
+        if end - position >= _window_bits:
+            window = _get_bits(src, position, _window_bits)
+            count = counts[window]
+            if count:
+                if count > n - i:
+                    count = n - i
+                for j in range(count):
+                    dst[i + j] = symbols[_window_symbols * window + j]
+                position += ends[_window_symbols * window + count - 1]
+                i += count
+                continue
+        node = 0
+        while position < end:
+            node = tree[2 * node + ((src[position >> 3] >> (7 - (position & 7))) & 1)]
+            position += 1
+            if node <= 0:
+                break
+        if node >= 0: # truncated or invalid code
+            break
+        dst[i] = -node - 1
+        i += 1
+    if i == n:
+        offset[0] = position
+    return i
+
+cdef class PrefixCode:
+    """
+    Type identifier of a prefix code (such as a Huffman code).
+
+    Arguments
+    ----------------------------------------------------------------------------
+
+      - `table`: a dictionary whose keys are the symbols 
+        and values are their codes, as strings of `'0'` and `'1'`.
+        No code should be a prefix of another one.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> code = PrefixCode({"a": "0", "b": "10", "c": "11"})
+        >>> stream = BitStream(list("abca"), code)
+        >>> stream
+        010110
+        >>> stream.read(code, 4)
+        ['a', 'b', 'c', 'a']
+    """
+    def __init__(self, table):
+        cdef Py_ssize_t i, num_symbols = len(table)
+        cdef np.int32_t node, num_nodes
+        cdef np.ndarray[np.int32_t, ndim=1] tree
+        if num_symbols == 0:
+            raise ValueError("the table should not be empty.")
+        self.table = dict(table)
+        self._symbols = tuple(self.table)
+        self._indices = {}
+        self._codes = numpy.zeros(num_symbols, dtype=uint64)
+        self._lengths = numpy.zeros(num_symbols, dtype=uint8)
+        tree = numpy.zeros(2 * 2 * num_symbols, dtype=numpy.int32)
+        num_nodes = 1
+        for i, symbol in enumerate(self._symbols):
+            bits = self.table[symbol]
+            if not 1 <= len(bits) <= 64 or set(bits) - set("01"):
+                error = "invalid code {0!r} for symbol {1!r}."
+                raise ValueError(error.format(bits, symbol))
+            self._indices[symbol] = i
+            self._codes[i] = int(bits, 2)
+            self._lengths[i] = len(bits)
+            node = 0
+            for j, bit in enumerate(bits):
+                child = 2 * node + (bit == "1")
+                if tree[child] < 0 or (tree[child] > 0 and j == len(bits) - 1):
+                    raise ValueError("the code is not prefix-free.")
+                if j == len(bits) - 1:
+                    tree[child] = -i - 1
+                else:
+                    if tree[child] == 0:
+                        if 2 * num_nodes + 2 > len(tree):
+                            tree = numpy.concatenate([tree, numpy.zeros_like(tree)])
+                        tree[child] = num_nodes
+                        num_nodes += 1
+                    node = tree[child]
+        self._tree = tree
+        self._init_symbols()
+        self._init_window_table()
+
+    def _init_symbols(self):
+        symbols = self._symbols
+        self._symbol_array = None
+        self._index_table = None
+        if all(builtins_type(symbol) is int for symbol in symbols):
+            self._symbol_array = numpy.array(symbols, dtype=int64)
+            self._index_min = min(symbols)
+            if max(symbols) - self._index_min < 2**20:
+                self._index_table = numpy.full(
+                  max(symbols) - self._index_min + 1, -1, dtype=int64
+                )
+                self._index_table[self._symbol_array - self._index_min] = \
+                  numpy.arange(len(symbols))
+
+    def _init_window_table(self):
+        cdef np.ndarray[np.int32_t, ndim=1] tree = self._tree
+        cdef np.ndarray[np.uint8_t, ndim=1] counts
+        cdef np.ndarray[np.uint32_t, ndim=1] symbols
+        cdef np.ndarray[np.uint8_t, ndim=1] ends
+        cdef unsigned int window, position, count
+        cdef np.int32_t node
+        cdef unsigned int num_windows = 1 << _window_bits
+        counts = numpy.zeros(num_windows, dtype=uint8)
+        symbols = numpy.zeros(_window_symbols * num_windows, dtype=numpy.uint32)
+        ends = numpy.zeros(_window_symbols * num_windows, dtype=uint8)
+        for window in range(num_windows):
+            position = 0
+            count = 0
+            node = 0
+            while count < _window_symbols and position < _window_bits:
+                node = tree[2 * node + ((window >> (_window_bits - 1 - position)) & 1)]
+                position += 1
+                if node == 0:
+                    break
+                elif node < 0:
+                    symbols[_window_symbols * window + count] = -node - 1
+                    ends[_window_symbols * window + count] = position
+                    count += 1
+                    node = 0
+            counts[window] = count
+        self._table_counts = counts
+        self._table_symbols = symbols
+        self._table_ends = ends
+
+    @classmethod
+    def from_frequencies(cls, frequencies):
+        """
+        Create the Huffman code of a dictionary of symbol frequencies.
+
+        The code is canonical: the codes of a given length are consecutive
+        integers, in the order of the symbols in `frequencies`.
+
+        Usage
+        ------------------------------------------------------------------------
+
+            >>> PrefixCode.from_frequencies({"a": 0.5, "b": 0.25, "c": 0.25})
+            PrefixCode({'a': '0', 'b': '10', 'c': '11'})
+        """
+        import heapq
+        symbols = list(frequencies)
+        if not symbols:
+            raise ValueError("the frequencies should not be empty.")
+        lengths = [0] * len(symbols)
+        heap = [(frequencies[symbol], i, [i]) for i, symbol in enumerate(symbols)]
+        heapq.heapify(heap)
+        counter = len(symbols)
+        while len(heap) > 1:
+            weight_0, _, group_0 = heapq.heappop(heap)
+            weight_1, _, group_1 = heapq.heappop(heap)
+            for i in group_0 + group_1:
+                lengths[i] += 1
+            heapq.heappush(heap, (weight_0 + weight_1, counter, group_0 + group_1))
+            counter += 1
+        lengths = [max(length, 1) for length in lengths]
+        if max(lengths) > 64:
+            raise ValueError("the code is too long.")
+        table = {}
+        code = 0
+        previous = 0
+        for length, i in sorted(zip(lengths, range(len(symbols)))):
+            code = code << (length - previous)
+            table[symbols[i]] = format(code, "0{0}b".format(length))
+            code += 1
+            previous = length
+        return cls({symbol: table[symbol] for symbol in symbols})
+
+    def __repr__(self):
+        return "PrefixCode({0!r})".format(self.table)
+
+cdef np.ndarray _prefix_code_indices(PrefixCode code, data):
+    """
+    Return the array of indices of the symbols in `data`.
+    """
+    if not isinstance(data, (list, ndarray)):
+        data = [data]
+    if code._index_table is not None:
+        array = numpy.asarray(data)
+        if array.ndim == 1 and array.dtype.kind in "iu":
+            array = array.astype(int64) - code._index_min
+            if len(array) and \
+               (array.min() < 0 or array.max() >= len(code._index_table)):
+                raise ValueError("unknown symbol.")
+            indices = code._index_table[array]
+            if (indices < 0).any():
+                raise ValueError("unknown symbol.")
+            return indices
+    indices = numpy.empty(len(data), dtype=int64)
+    for i, symbol in enumerate(data):
+        try:
+            indices[i] = code._indices[symbol]
+        except (KeyError, TypeError):
+            raise ValueError("unknown symbol {0!r}.".format(symbol))
+    return indices
+
+cpdef read_prefix_code(BitStream stream, PrefixCode code, n=None):
+    """
+    Read symbols encoded with a prefix code from a stream.
+    """
+    cdef size_t num_symbols = 1 if n is None else n
+    cdef np.ndarray indices = numpy.empty(num_symbols, dtype=numpy.uint32)
+    cdef unsigned long long offset = stream._read_offset
+    cdef size_t count
+    cdef np.uint32_t *dst = <np.uint32_t *>np.PyArray_DATA(indices)
+    cdef const unsigned char *src = stream._bytes
+    cdef unsigned long long end = stream._write_offset
+    cdef const np.int32_t *tree = <np.int32_t *>np.PyArray_DATA(code._tree)
+    cdef const np.uint8_t *counts = <np.uint8_t *>np.PyArray_DATA(code._table_counts)
+    cdef const np.uint32_t *symbols = <np.uint32_t *>np.PyArray_DATA(code._table_symbols)
+    cdef const np.uint8_t *ends = <np.uint8_t *>np.PyArray_DATA(code._table_ends)
+    if num_symbols < nogil_threshold:
+        count = _get_codes(dst, num_symbols, src, &offset, end, 
+                           tree, counts, symbols, ends)
+    else:
+        with nogil:
+            count = _get_codes(dst, num_symbols, src, &offset, end, 
+                               tree, counts, symbols, ends)
+    if count < num_symbols:
+        raise ReadError("invalid or truncated code.")
+    stream._read_offset = offset
+    if n is None:
+        return code._symbols[indices[0]]
+    elif code._symbol_array is not None:
+        return code._symbol_array[indices]
+    else:
+        _symbols = code._symbols
+        return [_symbols[i] for i in indices]
+
+cpdef write_prefix_code(BitStream stream, PrefixCode code, data):
+    """
+    Write symbols encoded with a prefix code into a stream.
+    """
+    cdef np.ndarray indices = _prefix_code_indices(code, data)
+    cdef size_t n = len(indices)
+    cdef unsigned long long num_bits
+    cdef const np.int64_t *_indices = <np.int64_t *>np.PyArray_DATA(indices)
+    cdef const uint64_t *codes = <uint64_t *>np.PyArray_DATA(code._codes)
+    cdef const np.uint8_t *lengths = <np.uint8_t *>np.PyArray_DATA(code._lengths)
+    if n == 0:
+        return
+    num_bits = code._lengths[indices].sum(dtype=uint64)
+    stream._extend(num_bits)
+    if num_bits < 8 * nogil_threshold:
+        _put_codes(stream._bytes, stream._write_offset, _indices, n, codes, lengths)
+    else:
+        with nogil:
+            _put_codes(stream._bytes, stream._write_offset, 
+                       _indices, n, codes, lengths)
+    stream._write_offset += num_bits
+
+def _prefix_code_reader(PrefixCode instance):
+    def reader(BitStream stream, n=None):
+        return read_prefix_code(stream, instance, n)
+    return reader
+
+def _prefix_code_writer(PrefixCode instance):
+    def writer(BitStream stream, data):
+        write_prefix_code(stream, instance, data)
+    return writer
+
+register(PrefixCode, 
+         reader=_prefix_code_reader, writer=_prefix_code_writer)
+
+
+# Variable-Length Integers
+# ------------------------------------------------------------------------------
+# Every integer is first mapped to an unsigned integer (the "code number"),
+# which is then encoded as a run of zeros followed by a binary number.
+cdef enum:
+    _exp_golomb_code
+    _rice_code
+    _elias_delta_code
+
+cdef enum:
+    _unsigned_mapping      # n -> n
+    _positive_mapping      # n -> n - 1
+    _exp_golomb_mapping    # 0, 1, -1, 2, -2, ... -> 0, 1, 2, 3, 4, ...
+    _zigzag_mapping        # 0, -1, 1, -2, 2, ... -> 0, 1, 2, 3, 4, ...
+
+cdef uint64_t _max_run = (<uint64_t>1) << 58
+
+@cython.profile(False)
+cdef Py_ssize_t _map_integers(uint64_t *dst, const uint64_t *src, size_t n, 
+                              bint signed_src, unsigned int mapping,
+                              unsigned int code, unsigned int k, 
+                              unsigned long long *num_bits) noexcept nogil:
+    """
+    Map `n` integers to code numbers and compute the size of their codes.
+
+    Return the index of the first integer that cannot be encoded, or -1.
+    """
+    cdef size_t i
+    cdef uint64_t value, number, word
+    cdef unsigned int size
+    cdef unsigned long long total = 0
+    for i in range(n):
+        value = src[i]
+        if mapping == _unsigned_mapping or mapping == _positive_mapping:
+            if signed_src and <np.int64_t>value < 0:
+                return i
+            if mapping == _positive_mapping:
+                if value == 0:
+                    return i
+                value = value - 1
+        elif not signed_src and value >> 63:
+            return i
+        elif mapping == _exp_golomb_mapping:
+            if value == (<uint64_t>1) << 63:
+                return i
+            elif <np.int64_t>value > 0:
+                value = 2 * value - 1
+            else:
+                value = 2 * (-value)
+        else:
+            value = (value << 1) ^ <uint64_t>(<np.int64_t>value >> 63)
+        if code == _exp_golomb_code:
+            if value > <uint64_t>-1 - (<uint64_t>1 << k):
+                return i
+            size = 64 - clz64(value + (<uint64_t>1 << k))
+            total += 2 * size - 1 - k
+        elif code == _rice_code:
+            if (value >> k) >= _max_run:
+                return i
+            total += (value >> k) + 1 + k
+        else:
+            if value == <uint64_t>-1:
+                return i
+            size = 64 - clz64(value + 1)
+            total += 2 * (64 - clz64(size)) - 1 + size - 1
+        dst[i] = value
+    num_bits[0] = total
+    return -1
+
+@cython.profile(False)
+cdef void _put_integer_codes(unsigned char *dst, unsigned long long offset,
+                             const uint64_t *src, size_t n,
+                             unsigned int code, unsigned int k) noexcept nogil:
+    """
+    Encode `n` code numbers into `dst` at `offset`.
+    """
+    cdef _BitWriter writer
+    cdef size_t i
+    cdef uint64_t value
+    cdef unsigned int size, length_size
+    _writer_init(&writer, dst, offset)
+    for i in range(n):
+        value = src[i]
+        if code == _exp_golomb_code:
+            value = value + (<uint64_t>1 << k)
+            size = 64 - clz64(value)
+            _writer_put_zeros(&writer, size - 1 - k)
+            _writer_put(&writer, value, size)
+        elif code == _rice_code:
+            _writer_put_zeros(&writer, value >> k)
+            _writer_put(&writer, 
+                        (<uint64_t>1 << k) | (value & ((<uint64_t>1 << k) - 1)), 
+                        k + 1)
+        else:
+            value = value + 1
+            size = 64 - clz64(value)
+            length_size = 64 - clz64(size)
+            _writer_put_zeros(&writer, length_size - 1)
+            _writer_put(&writer, size, length_size)
+            if size > 1:
+                _writer_put(&writer, value ^ (<uint64_t>1 << (size - 1)), size - 1)
+    _writer_flush(&writer)
+
+@cython.profile(False)
+cdef size_t _get_integer_codes(uint64_t *dst, size_t n,
+                               const unsigned char *src, 
+                               unsigned long long *offset, 
+                               unsigned long long end, unsigned int code, 
+                               unsigned int k, unsigned int mapping) noexcept nogil:
+    """
+    Decode up to `n` integers from `src` at `offset[0]` (and before `end`).
+
+    Return the number of decoded integers; less than `n` integers are decoded 
+    if the data is invalid or truncated. On success, `offset[0]` is updated.
+    """
+    cdef unsigned long long position = offset[0]
+    cdef unsigned long long zeros
+    cdef unsigned int size
+    cdef uint64_t value
+    cdef size_t i
+
+    for i in range(n):
+        zeros = _count_run(src, position, end, False)
+        if code == _exp_golomb_code:
+            if zeros + k + 1 > 64 or end - position - zeros < zeros + k + 1:
+                return i
+            size = zeros + k + 1
+            value = _get_bits(src, position + zeros, size) - (<uint64_t>1 << k)
+            position += zeros + size
+        elif code == _rice_code:
+            if end - position - zeros < k + 1 or zeros >= _max_run:
+                return i
+            value = zeros << k
+            if k:
+                value = value | _get_bits(src, position + zeros + 1, k)
+            position += zeros + 1 + k
+        else:
+            if zeros >= 7 or end - position - zeros < zeros + 1:
+                return i
+            size = _get_bits(src, position + zeros, zeros + 1)
+            position += 2 * zeros + 1
+            if size > 64 or end - position < size - 1:
+                return i
+            value = (<uint64_t>1 << (size - 1))
+            if size > 1:
+                value = value | _get_bits(src, position, size - 1)
+            position += size - 1
+            value = value - 1
+        if mapping == _positive_mapping:
+            value = value + 1
+        elif mapping == _exp_golomb_mapping:
+            if value & 1:
+                value = (value >> 1) + 1
+            else:
+                value = -(value >> 1)
+        elif mapping == _zigzag_mapping:
+            value = (value >> 1) ^ (-(value & 1))
+        dst[i] = value
+    offset[0] = position
+    return n
+
+cdef class _integer_code:
+    """
+    Base class of the type identifiers of variable-length integer codes.
+    """
+
+cdef class exp_golomb(_integer_code):
+    """
+    Type identifier of the Exp-Golomb code of order `k` (0 to 63).
+
+    Unsigned integers are encoded by default; the mapping of signed integers
+    is the one of the H.264 `se(v)` syntax elements: `0, 1, -1, 2, -2, ...`.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream([0, 1, 2, 3], exp_golomb())
+        101001100100
+        >>> BitStream([0, 1, -1], exp_golomb(signed=True))
+        1010011
+    """
+    def __init__(self, k=0, bint signed=False):
+        if not 0 <= k <= 63:
+            raise ValueError("k should be in 0-63.")
+        self._code = _exp_golomb_code
+        self._k = k
+        self.signed = signed
+        self._mapping = _exp_golomb_mapping if signed else _unsigned_mapping
+
+    @property
+    def k(self):
+        return self._k
+
+    def __repr__(self):
+        if self.signed:
+            return "exp_golomb({0}, signed=True)".format(self._k)
+        return "exp_golomb({0})".format(self._k)
+
+cdef class rice(_integer_code):
+    """
+    Type identifier of the Golomb-Rice code of parameter `k` (0 to 63).
+
+    The quotient is encoded as a run of zeros terminated by a one, 
+    followed by the `k` lowest bits of the integer. Signed integers 
+    are first mapped to `0, -1, 1, -2, 2, ...` (as in FLAC residuals).
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream([0, 5], rice(2))
+        1000101
+    """
+    def __init__(self, k, bint signed=False):
+        if not 0 <= k <= 63:
+            raise ValueError("k should be in 0-63.")
+        self._code = _rice_code
+        self._k = k
+        self.signed = signed
+        self._mapping = _zigzag_mapping if signed else _unsigned_mapping
+
+    @property
+    def k(self):
+        return self._k
+
+    def __repr__(self):
+        if self.signed:
+            return "rice({0}, signed=True)".format(self._k)
+        return "rice({0})".format(self._k)
+
+cdef class elias_gamma(_integer_code):
+    """
+    Type identifier of the Elias gamma code of positive integers.
+
+    Signed integers are first mapped to `1, 2, 3, ...` in the order 
+    `0, -1, 1, -2, 2, ...`.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream([1, 2, 5], elias_gamma())
+        101000101
+    """
+    def __init__(self, bint signed=False):
+        self._code = _exp_golomb_code
+        self._k = 0
+        self.signed = signed
+        self._mapping = _zigzag_mapping if signed else _positive_mapping
+
+    def __repr__(self):
+        return "elias_gamma(signed=True)" if self.signed else "elias_gamma()"
+
+cdef class elias_delta(_integer_code):
+    """
+    Type identifier of the Elias delta code of positive integers.
+
+    Signed integers are first mapped to `1, 2, 3, ...` in the order 
+    `0, -1, 1, -2, 2, ...`.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream([1, 2, 5], elias_delta())
+        1010001101
+    """
+    def __init__(self, bint signed=False):
+        self._code = _elias_delta_code
+        self._k = 0
+        self.signed = signed
+        self._mapping = _zigzag_mapping if signed else _positive_mapping
+
+    def __repr__(self):
+        return "elias_delta(signed=True)" if self.signed else "elias_delta()"
+
+cpdef read_integer_code(BitStream stream, _integer_code type, n=None):
+    """
+    Read integers encoded with a variable-length code from a stream.
+
+    The result is a scalar or an array of NumPy 64-bit integers 
+    (signed or unsigned depending on the type).
+    """
+    cdef size_t num_items = 1 if n is None else n
+    cdef np.ndarray array
+    cdef uint64_t *data
+    cdef unsigned long long offset = stream._read_offset
+    cdef size_t count
+    cdef const unsigned char *src = stream._bytes
+    cdef unsigned long long end = stream._write_offset
+    cdef unsigned int code = type._code, k = type._k, mapping = type._mapping
+
+    array = numpy.empty(num_items, dtype=int64 if type.signed else uint64)
+    data = <uint64_t *>np.PyArray_DATA(array)
+    if num_items < nogil_threshold:
+        count = _get_integer_codes(data, num_items, src, &offset, end, 
+                                   code, k, mapping)
+    else:
+        with nogil:
+            count = _get_integer_codes(data, num_items, src, &offset, end, 
+                                       code, k, mapping)
+    if count < num_items:
+        raise ReadError("invalid or truncated code.")
+    stream._read_offset = offset
+    return array[0] if n is None else array
+
+cpdef write_integer_code(BitStream stream, _integer_code type, data):
+    """
+    Write integers encoded with a variable-length code into a stream.
+    """
+    cdef np.ndarray array, numbers
+    cdef size_t num_items
+    cdef bint signed_src
+    cdef Py_ssize_t error
+    cdef unsigned long long num_bits = 0
+    cdef uint64_t *values
+    cdef uint64_t *_numbers
+    cdef unsigned int code = type._code, k = type._k, mapping = type._mapping
+
+    if isinstance(data, np.ndarray):
+        array = data
+    else:
+        try:
+            array = numpy.array(data, dtype=int64, ndmin=1)
+        except OverflowError: # Python integers larger than 2**63 - 1
+            array = numpy.array(data, dtype=uint64, ndmin=1)
+    if array.ndim > 1:
+        raise ValueError("data should be a scalar or a 1-dim. sequence.")
+    if array.ndim == 0:
+        array = array.reshape(1)
+    signed_src = array.dtype.kind != "u"
+    if signed_src:
+        array = numpy.ascontiguousarray(array, dtype=int64).view(uint64)
+    else:
+        array = numpy.ascontiguousarray(array, dtype=uint64)
+    num_items = array.shape[0]
+    numbers = numpy.empty(num_items, dtype=uint64)
+    values = <uint64_t *>np.PyArray_DATA(array)
+    _numbers = <uint64_t *>np.PyArray_DATA(numbers)
+    error = _map_integers(_numbers, values, num_items, signed_src, mapping,
+                          code, k, &num_bits)
+    if error >= 0:
+        value = array[error].view(int64) if signed_src else array[error]
+        raise ValueError("cannot encode {0} with {1!r}.".format(value, type))
+    stream._extend(num_bits)
+    if num_bits < 8 * nogil_threshold:
+        _put_integer_codes(stream._bytes, stream._write_offset, 
+                           _numbers, num_items, code, k)
+    else:
+        with nogil:
+            _put_integer_codes(stream._bytes, stream._write_offset, 
+                               _numbers, num_items, code, k)
+    stream._write_offset += num_bits
+
+def _integer_code_reader(_integer_code instance):
+    def reader(BitStream stream, n=None):
+        return read_integer_code(stream, instance, n)
+    return reader
+
+def _integer_code_writer(_integer_code instance):
+    def writer(BitStream stream, data):
+        write_integer_code(stream, instance, data)
+    return writer
+
+register(exp_golomb, 
+         reader=_integer_code_reader, writer=_integer_code_writer)
+register(rice, 
+         reader=_integer_code_reader, writer=_integer_code_writer)
+register(elias_gamma, 
+         reader=_integer_code_reader, writer=_integer_code_writer)
+register(elias_delta, 
+         reader=_integer_code_reader, writer=_integer_code_writer)
+
+
+# Varints
+# ------------------------------------------------------------------------------
+# LEB128 varints: groups of 7 bits, least significant group first, 
+# in bytes whose high bit is set unless they are the last of the varint.
+# The bytes may start at any bit offset.
+cdef uint64_t _high_bits = 0x8080808080808080ULL
+
+@cython.profile(False)
+cdef inline unsigned int _varint_size(uint64_t value) noexcept nogil:
+    return (70 - clz64(value)) // 7 if value else 1
+
+@cython.profile(False)
+cdef void _put_varints(unsigned char *dst, unsigned long long offset,
+                       const uint64_t *src, size_t n, bint zigzag) noexcept nogil:
+    """
+    Encode `n` integers as varints into `dst` at `offset`.
+    """
+    cdef _BitWriter writer
+    cdef size_t i
+    cdef unsigned int size, j
+    cdef uint64_t value, word
+    _writer_init(&writer, dst, offset)
+    for i in range(n):
+        value = src[i]
+        if zigzag:
+            value = (value << 1) ^ <uint64_t>(<np.int64_t>value >> 63)
+        size = _varint_size(value)
+        while size > 8:
+            _writer_put(&writer, 0x80 | (value & 0x7F), 8)
+            value = value >> 7
+            size -= 1
+        word = 0
+        for j in range(size - 1):
+            word = (word << 8) | 0x80 | ((value >> (7 * j)) & 0x7F)
+        word = (word << 8) | (value >> (7 * (size - 1)))
+        _writer_put(&writer, word, 8 * size)
+    _writer_flush(&writer)
+
+@cython.profile(False)
+cdef size_t _get_varints(uint64_t *dst, size_t n,
+                         const unsigned char *src, unsigned long long *offset, 
+                         unsigned long long end, bint zigzag) noexcept nogil:
+    """
+    Decode up to `n` varints from `src` at `offset[0]` (and before `end`).
+
+    Return the number of decoded varints; less than `n` varints are decoded 
+    if the data is invalid or truncated. On success, `offset[0]` is updated.
+    """
+    cdef unsigned long long position = offset[0]
+    cdef unsigned long long num_bytes
+    cdef uint64_t word, stops, value, byte
+    cdef unsigned int size, j
+    cdef size_t i
+
+    for i in range(n):
+        num_bytes = (end - position) >> 3
+        if num_bytes == 0:
+            return i
+        word = _peek_word(src, position, end)
+        stops = ~word & _high_bits
+        if num_bytes < 8:
+            stops = stops & ~((<uint64_t>-1) >> (8 * num_bytes))
+        if stops:
+            size = (clz64(stops) >> 3) + 1
+        elif num_bytes < 9:
+            return i
+        else: # 9 or 10 bytes
+            size = 8
+        value = 0
+        for j in range(size):
+            value = value | (((word >> (56 - 8 * j)) & 0x7F) << (7 * j))
+        position += 8 * size
+        if not stops:
+            byte = _get_bits(src, position, 8)
+            value = value | ((byte & 0x7F) << 56)
+            position += 8
+            if byte & 0x80:
+                if num_bytes < 10:
+                    return i
+                byte = _get_bits(src, position, 8)
+                if byte > 1:
+                    return i
+                value = value | (byte << 63)
+                position += 8
+        if zigzag:
+            value = (value >> 1) ^ (-(value & 1))
+        dst[i] = value
+    offset[0] = position
+    return n
+
+@cython.profile(False)
+cdef unsigned long long _count_varints(const unsigned char *src, 
+                                       unsigned long long offset,
+                                       unsigned long long num_bytes) noexcept nogil:
+    """
+    Count the last bytes of varints among `num_bytes` bytes of `src` at `offset`.
+    """
+    cdef unsigned long long count = 0
+    cdef uint64_t word
+    while num_bytes >= 8:
+        if offset & 7:
+            word = _get_bits(src, offset, 64)
+        else:
+            word = load_be64(src + (offset >> 3))
+        count += popcount64(~word & _high_bits)
+        offset += 64
+        num_bytes -= 8
+    if num_bytes:
+        word = _get_bits(src, offset, 8 * num_bytes) << (64 - 8 * num_bytes)
+        count += popcount64(~word & _high_bits & ~((<uint64_t>-1) >> (8 * num_bytes)))
+    return count
+
+cdef class varint:
+    """
+    Type identifier of unsigned integers encoded as (LEB128) varints.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream(300, varint)
+        1010110000000010
+        >>> BitStream(300, varint).read(varint)
+        300
+    """
+
+cdef class svarint:
+    """
+    Type identifier of signed integers encoded as zigzag varints.
+
+    The integers `0, -1, 1, -2, 2, ...` are encoded as the varints
+    of `0, 1, 2, 3, 4, ...`.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> BitStream(-2, svarint)
+        00000011
+    """
+
+cdef object _read_varints(BitStream stream, n, bint zigzag):
+    cdef size_t num_items = 1 if n is None else n
+    cdef np.ndarray array
+    cdef uint64_t *data
+    cdef unsigned long long offset = stream._read_offset
+    cdef size_t count
+    cdef const unsigned char *src = stream._bytes
+    cdef unsigned long long end = stream._write_offset
+
+    array = numpy.empty(num_items, dtype=int64 if zigzag else uint64)
+    data = <uint64_t *>np.PyArray_DATA(array)
+    if num_items < nogil_threshold:
+        count = _get_varints(data, num_items, src, &offset, end, zigzag)
+    else:
+        with nogil:
+            count = _get_varints(data, num_items, src, &offset, end, zigzag)
+    if count < num_items:
+        raise ReadError("invalid or truncated varint.")
+    stream._read_offset = offset
+    return array[0] if n is None else array
+
+cdef int _write_varints(BitStream stream, data, bint zigzag) except -1:
+    cdef np.ndarray array
+    cdef size_t num_items, i
+    cdef unsigned long long num_bits = 0
+    cdef uint64_t *values
+
+    if isinstance(data, np.ndarray):
+        array = data
+    else:
+        try:
+            array = numpy.array(data, dtype=int64, ndmin=1)
+        except OverflowError: # Python integers larger than 2**63 - 1
+            array = numpy.array(data, dtype=uint64, ndmin=1)
+    if array.ndim > 1:
+        raise ValueError("data should be a scalar or a 1-dim. sequence.")
+    if array.ndim == 0:
+        array = array.reshape(1)
+    if array.dtype.kind == "u":
+        array = numpy.ascontiguousarray(array, dtype=uint64)
+        invalid = (array >> 63).astype(bool) if zigzag else None
+    else:
+        array = numpy.ascontiguousarray(array, dtype=int64)
+        invalid = None if zigzag else array < 0
+    if invalid is not None and invalid.any():
+        value = array[invalid][0]
+        type = svarint if zigzag else varint
+        raise ValueError("cannot encode {0} with {1}.".format(value, type.__name__))
+    num_items = array.shape[0]
+    values = <uint64_t *>np.PyArray_DATA(array)
+    for i in range(num_items):
+        if zigzag:
+            num_bits += 8 * _varint_size(
+              (values[i] << 1) ^ <uint64_t>(<np.int64_t>values[i] >> 63)
+            )
+        else:
+            num_bits += 8 * _varint_size(values[i])
+    stream._extend(num_bits)
+    if num_bits < 8 * nogil_threshold:
+        _put_varints(stream._bytes, stream._write_offset, 
+                     values, num_items, zigzag)
+    else:
+        with nogil:
+            _put_varints(stream._bytes, stream._write_offset, 
+                         values, num_items, zigzag)
+    stream._write_offset += num_bits
+    return 0
+
+cpdef read_varint(BitStream stream, n=None):
+    """
+    Read unsigned integers encoded as varints from a stream.
+
+    The result is a scalar or an array of NumPy unsigned 64-bit integers.
+    """
+    return _read_varints(stream, n, False)
+
+cpdef write_varint(BitStream stream, data):
+    """
+    Write unsigned integers (less than `2**64`) as varints into a stream.
+    """
+    _write_varints(stream, data, False)
+
+cpdef read_svarint(BitStream stream, n=None):
+    """
+    Read signed integers encoded as zigzag varints from a stream.
+
+    The result is a scalar or an array of NumPy signed 64-bit integers.
+    """
+    return _read_varints(stream, n, True)
+
+cpdef write_svarint(BitStream stream, data):
+    """
+    Write signed 64-bit integers as zigzag varints into a stream.
+    """
+    _write_varints(stream, data, True)
+
+cpdef count_varints(BitStream stream, num_bytes=None):
+    """
+    Count the varints that end in the first `num_bytes` bytes of a stream.
+
+    The bytes are not consumed. By default, all the (whole) bytes of 
+    the stream are considered. Use the count to preallocate output arrays
+    or as the number of varints to read.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> stream = BitStream([1, 300, 2], varint)
+        >>> count_varints(stream)
+        3
+        >>> count_varints(stream, 2)
+        1
+    """
+    cdef unsigned long long _num_bytes
+    cdef unsigned long long count
+    cdef const unsigned char *src = stream._bytes
+    cdef unsigned long long offset = stream._read_offset
+    if num_bytes is None:
+        _num_bytes = len(stream) // 8
+    else:
+        if num_bytes < 0:
+            raise ValueError("num_bytes should be non-negative.")
+        if 8 * num_bytes > len(stream):
+            raise ReadError("end of stream")
+        _num_bytes = num_bytes
+    if _num_bytes < nogil_threshold:
+        count = _count_varints(src, offset, _num_bytes)
+    else:
+        with nogil:
+            count = _count_varints(src, offset, _num_bytes)
+    return count
+
+register(varint, reader=read_varint, writer=write_varint)
+register(svarint, reader=read_svarint, writer=write_svarint)
+
+
+# Bit Packing
+# ------------------------------------------------------------------------------
+# Integers are packed by blocks. Every block starts with a header: 
+#
+#   - the number of integers in the block minus one (16 bits),
+#   - the delta flag (1 bit) and the width (7 bits) of the packed integers,
+#   - the reference (an svarint) and, with the delta flag, the first integer
+#     of the block (an svarint).
+#
+# The packed integers are the differences between the integers of the block
+# (or the differences between consecutive integers, with the delta flag) 
+# and the reference, which is their minimum.
+cdef enum:
+    _packed_header_bits = 24
+
+@cython.profile(False)
+cdef inline uint64_t _zigzag(uint64_t value) noexcept nogil:
+    return (value << 1) ^ <uint64_t>(<np.int64_t>value >> 63)
+
+@cython.profile(False)
+cdef inline unsigned int _width(uint64_t value) noexcept nogil:
+    return 64 - clz64(value) if value else 0
+
+@cython.profile(False)
+cdef unsigned long long _pack_block(uint64_t *dst, const uint64_t *src, 
+                                    size_t n, int delta, bint *use_delta, 
+                                    unsigned int *width, 
+                                    uint64_t *reference) noexcept nogil:
+    """
+    Pack a block of `n` integers (with delta coding if `delta` is 1, 
+    without if it is 0, whichever is smaller if it is -1) into `dst`.
+
+    Return the size of the encoded block in bits.
+    """
+    cdef size_t i
+    cdef np.int64_t value, minimum, maximum, delta_minimum
+    cdef unsigned int for_width, delta_width
+    cdef unsigned long long for_size, delta_size = 0
+
+    minimum = maximum = src[0]
+    for i in range(1, n):
+        value = src[i]
+        minimum = value if value < minimum else minimum
+        maximum = value if value > maximum else maximum
+    for_width = _width(<uint64_t>maximum - <uint64_t>minimum)
+    for_size = _packed_header_bits + 8 * _varint_size(_zigzag(minimum)) + \
+               n * for_width
+    use_delta[0] = False
+    if delta != 0 and n > 1:
+        delta_minimum = maximum = src[1] - src[0]
+        for i in range(2, n):
+            value = src[i] - src[i - 1]
+            delta_minimum = value if value < delta_minimum else delta_minimum
+            maximum = value if value > maximum else maximum
+        delta_width = _width(<uint64_t>maximum - <uint64_t>delta_minimum)
+        delta_size = _packed_header_bits + \
+                     8 * _varint_size(_zigzag(delta_minimum)) + \
+                     8 * _varint_size(_zigzag(src[0])) + \
+                     (n - 1) * delta_width
+        use_delta[0] = delta == 1 or delta_size < for_size
+    if use_delta[0]:
+        for i in range(1, n):
+            dst[i - 1] = src[i] - src[i - 1] - <uint64_t>delta_minimum
+        width[0] = delta_width
+        reference[0] = delta_minimum
+        return delta_size
+    else:
+        for i in range(n):
+            dst[i] = src[i] - <uint64_t>minimum
+        width[0] = for_width
+        reference[0] = minimum
+        return for_size
+
+@cython.profile(False)
+cdef unsigned long long _put_packed(unsigned char *dst, unsigned long long offset,
+                                    const uint64_t *src, size_t n, size_t block,
+                                    int delta, uint64_t *work) noexcept nogil:
+    """
+    Pack `n` integers by blocks into `dst` at `offset` (if `dst` is not NULL).
+
+    Return the size of the encoded data in bits.
+    """
+    cdef size_t i = 0, count
+    cdef bint use_delta
+    cdef unsigned int width
+    cdef uint64_t reference
+    cdef unsigned long long start = offset, size
+    while i < n:
+        count = block if n - i > block else n - i
+        size = _pack_block(work, src + i, count, delta, 
+                           &use_delta, &width, &reference)
+        if dst != NULL:
+            _put_bits(dst, offset, 16, count - 1)
+            _put_bits(dst, offset + 16, 8, (use_delta << 7) | width)
+            offset += _packed_header_bits
+            _put_varints(dst, offset, &reference, 1, True)
+            offset += 8 * _varint_size(_zigzag(reference))
+            if use_delta:
+                _put_varints(dst, offset, src + i, 1, True)
+                offset += 8 * _varint_size(_zigzag(src[i]))
+            if width:
+                _put_fields(dst, offset, work, count - use_delta, width, False)
+                offset += (count - use_delta) * width
+        else:
+            offset += size
+        i += count
+    return offset - start
+
+@cython.profile(False)
+cdef bint _get_packed_header(const unsigned char *src, 
+                             unsigned long long *offset,
+                             unsigned long long end, size_t *count, 
+                             bint *use_delta, unsigned int *width, 
+                             uint64_t *reference, uint64_t *first) noexcept nogil:
+    """
+    Decode a block header and check that the block data is available.
+    """
+    cdef unsigned long long position = offset[0]
+    cdef uint64_t flags
+    if end - position < _packed_header_bits:
+        return False
+    count[0] = _get_bits(src, position, 16) + 1
+    flags = _get_bits(src, position + 16, 8)
+    use_delta[0] = flags >> 7
+    width[0] = flags & 0x7F
+    position += _packed_header_bits
+    if width[0] > 64 or (use_delta[0] and count[0] == 1):
+        return False
+    if _get_varints(reference, 1, src, &position, end, True) == 0:
+        return False
+    if use_delta[0] and _get_varints(first, 1, src, &position, end, True) == 0:
+        return False
+    if end - position < (count[0] - use_delta[0]) * width[0]:
+        return False
+    offset[0] = position
+    return True
+
+@cython.profile(False)
+cdef int _get_packed(uint64_t *dst, size_t n, const unsigned char *src, 
+                     unsigned long long *offset, 
+                     unsigned long long end) noexcept nogil:
+    """
+    Unpack the blocks of `n` integers from `src` at `offset[0]`.
+
+    Return 0 on success (and update `offset[0]`), -1 if the data is invalid
+    or truncated and -2 if the `n`-th integer does not end a block. 
+    """
+    cdef unsigned long long position = offset[0]
+    cdef size_t i = 0, j, count, m
+    cdef bint use_delta
+    cdef unsigned int width
+    cdef uint64_t reference, first, value
+    cdef uint64_t *out
+    while i < n:
+        if not _get_packed_header(src, &position, end, &count, 
+                                  &use_delta, &width, &reference, &first):
+            return -1
+        if count > n - i:
+            return -2
+        m = count - use_delta
+        out = dst + i + use_delta
+        if width:
+            _get_fields(<np.uint64_t *>out, src, position, m, width, False, False)
+        else:
+            for j in range(m):
+                out[j] = 0
+        position += m * width
+        if use_delta:
+            dst[i] = value = first
+            for j in range(m):
+                value = value + out[j] + reference
+                out[j] = value
+        else:
+            for j in range(m):
+                out[j] = out[j] + reference
+        i += count
+    offset[0] = position
+    return 0
+
+@cython.profile(False)
+cdef bint _count_packed(const unsigned char *src, unsigned long long offset, 
+                        unsigned long long end, size_t *n) noexcept nogil:
+    """
+    Count the integers of the blocks found between `offset` and `end`.
+
+    Return false if the last block is invalid or truncated.
+    """
+    cdef size_t count
+    cdef bint use_delta
+    cdef unsigned int width
+    cdef uint64_t reference, first
+    n[0] = 0
+    while offset < end:
+        if not _get_packed_header(src, &offset, end, &count, 
+                                  &use_delta, &width, &reference, &first):
+            return False
+        offset += (count - use_delta) * width
+        n[0] += count
+    return True
+
+cpdef write_packed(BitStream stream, data, block=128, delta=None):
+    """
+    Write signed 64-bit integers into a stream by blocks of bit-packed data.
+
+    The integers of a block (or their differences with the previous ones if
+    `delta` is true) are stored relatively to their minimum, with the smallest
+    number of bits that holds them. By default, delta coding is used for the
+    blocks where it produces a smaller output.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> stream = BitStream()
+        >>> write_packed(stream, range(1000, 1128))
+        >>> len(stream)
+        48
+        >>> read_packed(stream)[-1]
+        1127
+    """
+    cdef np.ndarray array, work
+    cdef size_t num_items, _block
+    cdef int _delta = -1 if delta is None else (1 if delta else 0)
+    cdef unsigned long long num_bits
+    cdef uint64_t *values
+    cdef uint64_t *_work
+
+    if not 1 <= block <= 65536:
+        raise ValueError("block should be in 1-65536.")
+    _block = block
+    if isinstance(data, np.ndarray):
+        array = data
+    else:
+        array = numpy.array(data, dtype=int64, ndmin=1)
+    if array.ndim > 1:
+        raise ValueError("data should be a scalar or a 1-dim. sequence.")
+    if array.ndim == 0:
+        array = array.reshape(1)
+    if array.dtype.kind == "u":
+        array = numpy.ascontiguousarray(array, dtype=uint64)
+    else:
+        array = numpy.ascontiguousarray(array, dtype=int64).view(uint64)
+    num_items = array.shape[0]
+    work = numpy.empty(_block, dtype=uint64)
+    values = <uint64_t *>np.PyArray_DATA(array)
+    _work = <uint64_t *>np.PyArray_DATA(work)
+    if num_items < nogil_threshold:
+        num_bits = _put_packed(NULL, 0, values, num_items, _block, _delta, _work)
+    else:
+        with nogil:
+            num_bits = _put_packed(NULL, 0, values, num_items, 
+                                   _block, _delta, _work)
+    stream._extend(num_bits)
+    if num_items < nogil_threshold:
+        _put_packed(stream._bytes, stream._write_offset, 
+                    values, num_items, _block, _delta, _work)
+    else:
+        with nogil:
+            _put_packed(stream._bytes, stream._write_offset, 
+                        values, num_items, _block, _delta, _work)
+    stream._write_offset += num_bits
+
+cpdef read_packed(BitStream stream, n=None):
+    """
+    Read `n` integers written with `write_packed` from a stream.
+
+    The `n` integers should end a block. By default, all the blocks 
+    of the stream are read. The result is an array of NumPy signed 
+    64-bit integers.
+    """
+    cdef size_t num_items
+    cdef np.ndarray array
+    cdef int status
+    cdef const unsigned char *src = stream._bytes
+    cdef unsigned long long offset = stream._read_offset
+    cdef unsigned long long end = stream._write_offset
+    cdef uint64_t *data
+
+    if n is None:
+        if not _count_packed(src, offset, end, &num_items):
+            raise ReadError("invalid or truncated block.")
+    else:
+        num_items = n
+    array = numpy.empty(num_items, dtype=int64)
+    data = <uint64_t *>np.PyArray_DATA(array)
+    if num_items < nogil_threshold:
+        status = _get_packed(data, num_items, src, &offset, end)
+    else:
+        with nogil:
+            status = _get_packed(data, num_items, src, &offset, end)
+    if status == -1:
+        raise ReadError("invalid or truncated block.")
+    elif status == -2:
+        raise ValueError("the last integer does not end a block.")
+    stream._read_offset = offset
+    return array
+
+
+# Runs
+# ------------------------------------------------------------------------------
+# Sequences of bools are encoded as the lengths of their runs. Each run is 
+# stored as a single Exp-Golomb code of order 0 of `2 * (length - 1) + value`,
+# so that every run is self-contained: a sequence of runs may be read in 
+# several calls, as long as each call ends on a run boundary.
+cdef exp_golomb _run_code = exp_golomb()
+
+@cython.profile(False)
+cdef int _get_runs(np.uint8_t *dst, size_t n, 
+                   const unsigned char *src, unsigned long long *offset, 
+                   unsigned long long end) noexcept nogil:
+    """
+    Decode the runs of `n` bools from `src` at `offset[0]`.
+
+    Return 0 on success (and update `offset[0]`), -1 if the data is invalid
+    or truncated and -2 if the `n`-th bool does not end a run. 
+    """
+    cdef unsigned long long position = offset[0]
+    cdef size_t i = 0
+    cdef uint64_t code, length
+    while i < n:
+        if _get_integer_codes(&code, 1, src, &position, end, 
+                              _exp_golomb_code, 0, _unsigned_mapping) == 0:
+            return -1
+        length = (code >> 1) + 1
+        if length > n - i:
+            return -2
+        memset(dst + i, code & 1, length)
+        i += length
+    offset[0] = position
+    return 0
+
+cpdef count_run(BitStream stream, bint value):
+    """
+    Count the consecutive bits equal to `value` at the start of a stream.
+
+    The bits are scanned 64 at a time and are not consumed.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> stream = BitStream([True, True, True, False])
+        >>> count_run(stream, True)
+        3
+        >>> count_run(stream, False)
+        0
+    """
+    cdef unsigned long long count
+    cdef const unsigned char *src = stream._bytes
+    cdef unsigned long long offset = stream._read_offset
+    cdef unsigned long long end = stream._write_offset
+    if end - offset < 8 * 8 * nogil_threshold:
+        count = _count_run(src, offset, end, value)
+    else:
+        with nogil:
+            count = _count_run(src, offset, end, value)
+    return count
+
+cpdef write_runs(BitStream stream, data):
+    """
+    Write bools -- or the lengths of their runs -- as run lengths into a stream.
+
+    The data is either a sequence of bools, or a sequence of run lengths 
+    which alternate between `False` and `True` runs, starting with a (possibly
+    empty) `False` run.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> stream = BitStream()
+        >>> write_runs(stream, [False, False, True, True, True])
+        >>> stream
+        01100110
+        >>> write_runs(stream, [2, 3])
+        >>> stream
+        0110011001100110
+        >>> read_runs(stream, 5)
+        array([False, False,  True,  True,  True])
+        >>> read_runs(stream, 5)
+        array([False, False,  True,  True,  True])
+    """
+    cdef np.ndarray array, lengths, values, changes
+
+    if isinstance(data, np.ndarray):
+        array = data
+    else:
+        array = numpy.array(data)
+        if array.dtype != bool:
+            array = numpy.array(data, dtype=int64)
+    if array.ndim != 1:
+        raise ValueError("data should be a 1-dim. sequence.")
+    if array.dtype == bool:
+        if len(array) == 0:
+            return
+        changes = numpy.flatnonzero(array[1:] != array[:-1]) + 1
+        lengths = numpy.diff(numpy.r_[0, changes, len(array)])
+        values = array[numpy.r_[0, changes]]
+    elif array.dtype.kind in "iu":
+        lengths = array
+        if len(lengths) and ((lengths < 0).any() or (lengths[1:] == 0).any()):
+            raise ValueError("invalid run lengths.")
+        values = numpy.arange(len(lengths)) % 2 == 1
+        if len(lengths) and lengths[0] == 0:
+            lengths = lengths[1:]
+            values = values[1:]
+    else:
+        raise TypeError("data should be a sequence of bools or of integers.")
+    lengths = lengths.astype(uint64)
+    write_integer_code(stream, _run_code, 
+                       2 * (lengths - 1) + values.astype(uint64))
+
+cpdef read_runs(BitStream stream, n):
+    """
+    Read `n` bools encoded as run lengths from a stream.
+
+    The `n`-th bool should end a run, but the runs written by a single 
+    `write_runs` call may be read in several calls. The result is a NumPy 
+    array of bools.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> stream = BitStream()
+        >>> write_runs(stream, [False, False, True, True, True, False])
+        >>> read_runs(stream, 2)
+        array([False, False])
+        >>> read_runs(stream, 3)
+        array([ True,  True,  True])
+        >>> read_runs(stream, 1)
+        array([False])
+    """
+    cdef size_t num_items = n
+    cdef np.ndarray array = numpy.empty(num_items, dtype=bool)
+    cdef int status
+    cdef np.uint8_t *data = <np.uint8_t *>np.PyArray_DATA(array)
+    cdef const unsigned char *src = stream._bytes
+    cdef unsigned long long offset = stream._read_offset
+    cdef unsigned long long end = stream._write_offset
+    if num_items < 8 * nogil_threshold:
+        status = _get_runs(data, num_items, src, &offset, end)
+    else:
+        with nogil:
+            status = _get_runs(data, num_items, src, &offset, end)
+    if status == -1:
+        raise ReadError("invalid or truncated run length.")
+    elif status == -2:
+        raise ValueError("the last bool does not end a run.")
+    stream._read_offset = offset
+    return array
+
+
+# Streaming Readers and Writers
+# ------------------------------------------------------------------------------
+cdef dict _bit_sizes = {
+  bool: 1, numpy.bool_: 1,
+  uint8: 8, int8: 8, uint16: 16, int16: 16, 
+  uint32: 32, int32: 32, uint64: 64, int64: 64,
+  float16: 16, float32: 32, float64: 64, float: 64,
+}
+
+cdef object _num_bits(type, n):
+    """
+    Return the number of bits needed by `read(type, n)`, 
+    `-1` if the read consumes the whole stream, `None` if it is unknown.
+    """
+    _type = builtins_type(type)
+    if type is None or type is BitStream:
+        return -1 if n is None else n
+    elif type is bytes:
+        return -1 if n is None else 8 * n
+    elif _type is uint or _type is sint:
+        size = type.num_bits
+    elif _type is little_endian:
+        size = 8 * (<little_endian>type).width
+    else:
+        size = _bit_sizes.get(type)
+        if size is None:
+            return None
+    return size if n is None else size * n
+
+class BitReader(object):
+    """
+    Read the binary data of a file object with a bounded amount of memory.
+
+    The data is read by chunks of `chunk_size` bytes with `readinto` 
+    (or `read`) as the reads require it. The data that has been read 
+    is discarded, unless a saved state may still restore it.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> import io
+        >>> reader = BitReader(io.BytesIO(b"ABC"))
+        >>> reader.read(bool, 4)
+        [False, True, False, False]
+        >>> reader.read(uint8)
+        20
+    """
+    def __init__(self, fileobj, chunk_size=65536):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size should be positive.")
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.stream = BitStream()
+        self.stream.compact_threshold = chunk_size
+        self._eof = False
+
+    def _fill(self, num_bytes):
+        """
+        Append up to `num_bytes` bytes of the file to the stream.
+
+        Return the number of bytes actually read (`0` at the end of the file).
+        """
+        if self._eof:
+            return 0
+        readinto = getattr(self.fileobj, "readinto", None)
+        if readinto is not None:
+            buffer = bytearray(num_bytes)
+            count = readinto(buffer) or 0
+            data = memoryview(buffer)[:count]
+        else:
+            data = self.fileobj.read(num_bytes) or b""
+            count = len(data)
+        if count == 0:
+            self._eof = True
+        else:
+            self.stream.write(data, bytes)
+        return count
+
+    def read(self, type=None, n=None):
+        """
+        Decode and consume `n` items of data (see `BitStream.read`).
+        """
+        stream = self.stream
+        num_bits = _num_bits(type, n)
+        if num_bits == -1: # the read consumes the remaining file
+            while self._fill(max(self.chunk_size, len(stream) // 8)):
+                pass
+        elif num_bits is not None:
+            while len(stream) < num_bits:
+                missing = (num_bits - len(stream) + 7) // 8
+                if not self._fill(max(self.chunk_size, missing)):
+                    break
+        else: # unknown size: try, then refill and retry.
+            while True:
+                state = stream.save()
+                try:
+                    return stream.read(type, n)
+                except ReadError:
+                    stream.restore(state)
+                    if not self._fill(max(self.chunk_size, len(stream) // 8)):
+                        raise
+        return stream.read(type, n)
+
+    def save(self):
+        """
+        Return a state of the reader (see `BitStream.save`).
+        """
+        return self.stream.save()
+
+    def restore(self, state):
+        """
+        Restore a state of the reader (see `BitStream.restore`).
+
+        The data read from the file since the state was saved is kept.
+        """
+        cdef BitStream stream = self.stream
+        cdef unsigned long long write_offset = stream._write_offset
+        stream.restore(state)
+        stream._write_offset = write_offset
+
+class AsyncBitReader(BitReader):
+    """
+    Read the binary data of an `asyncio.StreamReader`.
+
+    The reads are coroutines: they wait for exactly as many bytes 
+    as they need when their size is known, for chunks of `chunk_size` 
+    bytes otherwise.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> import asyncio
+        >>> async def main():
+        ...     stream_reader = asyncio.StreamReader()
+        ...     stream_reader.feed_data(b"ABC")
+        ...     stream_reader.feed_eof()
+        ...     reader = AsyncBitReader(stream_reader)
+        ...     return await reader.read(uint8, 2)
+        >>> asyncio.run(main())
+        array([65, 66], dtype=uint8)
+    """
+    async def _fetch(self, num_bytes=None):
+        """
+        Append `num_bytes` bytes of the stream reader to the stream 
+        (all its data if `num_bytes` is `None`).
+
+        Raise a `ReadError` if the end of the stream reader is reached first.
+        """
+        import asyncio
+        if num_bytes is None:
+            data = await self.fileobj.read()
+        else:
+            try:
+                data = await self.fileobj.readexactly(num_bytes)
+            except asyncio.IncompleteReadError as error:
+                self.stream.write(error.partial, bytes)
+                raise ReadError("end of stream")
+        self.stream.write(data, bytes)
+
+    async def read(self, type=None, n=None):
+        """
+        Decode and consume `n` items of data (see `BitStream.read`).
+        """
+        stream = self.stream
+        num_bits = _num_bits(type, n)
+        if num_bits == -1: # the read consumes the remaining data
+            await self._fetch()
+        elif num_bits is not None:
+            if len(stream) < num_bits:
+                await self._fetch((num_bits - len(stream) + 7) // 8)
+        else: # unknown size: try, then refill and retry.
+            while True:
+                state = stream.save()
+                try:
+                    return stream.read(type, n)
+                except ReadError:
+                    stream.restore(state)
+                    data = await self.fileobj.read(
+                      max(self.chunk_size, len(stream) // 8)
+                    )
+                    if not data:
+                        raise
+                    stream.write(data, bytes)
+        return stream.read(type, n)
+
+class BitWriter(object):
+    """
+    Write binary data into a file object with a bounded amount of memory.
+
+    The whole bytes of the stream are written to the file when at least
+    `chunk_size` of them are available; the trailing bits are kept 
+    until more data is written. Closing the writer pads them with zeros 
+    and writes them too (the file object is not closed).
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> import io
+        >>> output = io.BytesIO()
+        >>> with BitWriter(output) as writer:
+        ...     writer.write([False, True, False, False])
+        ...     writer.write(20, uint8)
+        >>> output.getvalue()
+        'A@'
+    """
+    def __init__(self, fileobj, chunk_size=65536):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size should be positive.")
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.stream = BitStream()
+        self.closed = False
+
+    def _flush_bytes(self):
+        stream = self.stream
+        num_bytes = len(stream) // 8
+        if num_bytes:
+            self.fileobj.write(stream.read(bytes, num_bytes))
+            stream.compact()
+
+    def write(self, data, type=None):
+        """
+        Encode `data` and append it to the file (see `BitStream.write`).
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed writer.")
+        self.stream.write(data, type)
+        if len(self.stream) >= 8 * self.chunk_size:
+            self._flush_bytes()
+
+    def flush(self):
+        """
+        Write all the whole bytes of the stream into the file.
+        """
+        self._flush_bytes()
+        flush = getattr(self.fileobj, "flush", None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        """
+        Pad the stream with zeros up to a whole number of bytes, then flush.
+        """
+        if self.closed:
+            return
+        num_bits = len(self.stream) % 8
+        if num_bits:
+            self.stream.write((8 - num_bits) * [False], bool)
+        self.flush()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Parallel Encoding
+# ------------------------------------------------------------------------------
+def _encode(chunk, type):
+    return BitStream(chunk, type)
+
+def parallel_encode(chunks, type=None, workers=None, executor="thread"):
+    """
+    Encode the items of `chunks` in a pool of workers, 
+    then concatenate the results in order into a single stream.
+
+    Arguments
+    ----------------------------------------------------------------------------
+
+      - `chunks`: an iterable of data, each of which is written with 
+        `BitStream(chunk, type)`.
+
+      - `type`: a type identifier or `None` (see `BitStream.write`).
+
+      - `workers`: the number of workers (the executor default if `None`).
+
+      - `executor`: `"thread"` or `"process"`.
+        Thread pools are effective for bulk array writes, which release
+        the GIL; process pools require that chunks, type identifiers
+        and their writers can be pickled.
+
+    Usage
+    ----------------------------------------------------------------------------
+
+        >>> parallel_encode([[1, 2], [3]], uint(3), workers=2)
+        001010011
+    """
+    import concurrent.futures
+    chunks = list(chunks)
+    if executor == "thread":
+        pool = concurrent.futures.ThreadPoolExecutor(workers)
+    elif executor == "process":
+        pool = concurrent.futures.ProcessPoolExecutor(workers)
+    else:
+        raise ValueError("unknown executor {0!r}.".format(executor))
+    with pool:
+        streams = list(pool.map(_encode, chunks, len(chunks) * [type]))
+    return _concatenate(streams)
+